@@ -11,6 +11,8 @@ from typing import List, Dict, Any, Tuple, Optional, Union
 from rich.table import Table
 from rich.console import Console
 from datetime import datetime
+from collections import deque
+from itertools import islice
 
 # Import enhanced database manager
 from core.database_manager import db_manager
@@ -22,7 +24,7 @@ class EnhancedExecutionAgent:
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.execution_history = []
+        self.execution_history = deque(maxlen=1000)  # Last 1000 entries
         self.performance_metrics = {
             "total_queries": 0,
             "successful_queries": 0,
@@ -137,10 +139,6 @@ class EnhancedExecutionAgent:
         
         self.execution_history.append(log_entry)
         
-        # Keep only last 1000 executions in memory
-        if len(self.execution_history) > 1000:
-            self.execution_history = self.execution_history[-1000:]
-        
         # Log to file for persistent storage
         self.logger.info(f"Query executed - Success: {success}, Time: {execution_time:.3f}s, Rows: {rows_returned}")
     
@@ -351,7 +349,7 @@ class EnhancedExecutionAgent:
         return {
             **self.performance_metrics,
             "success_rate": success_rate,
-            "recent_executions": self.execution_history[-10:],  # Last 10 executions
+            "recent_executions": list(islice(self.execution_history, max(len(self.execution_history) - 10, 0), None)),  # Last 10 executions
             "execution_history_size": len(self.execution_history)
         }
     
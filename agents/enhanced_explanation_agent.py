@@ -7,14 +7,14 @@ import re
 import logging
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
 
 class EnhancedExplanationAgent:
     """Enhanced explanation agent with AI-powered insights and contextual understanding"""
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.explanation_history = []
+        self.explanation_history = deque(maxlen=1000)  # Last 1000 entries
         self.explanation_patterns = self._load_explanation_patterns()
         
     def _load_explanation_patterns(self) -> Dict[str, Dict]:
@@ -518,10 +518,6 @@ class EnhancedExplanationAgent:
         
         self.explanation_history.append(log_entry)
         
-        # Keep history manageable
-        if len(self.explanation_history) > 1000:
-            self.explanation_history = self.explanation_history[-1000:]
-        
         self.logger.info(f"Explanation generated with confidence: {explanation_data.get('confidence_factors', {}).get('overall_confidence', 0):.2f}")
     
     def get_explanation_statistics(self) -> Dict[str, Any]:
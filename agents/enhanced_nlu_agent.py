@@ -14,6 +14,9 @@ except ImportError:
 
 import logging
 
+# Marks a parse call whose transformer score still has to be computed
+_NOT_SCORED = object()
+
 class EnhancedNLUAgent:
     def __init__(self, model_name: str = "microsoft/DialoGPT-medium"):
         """
@@ -25,6 +28,7 @@ class EnhancedNLUAgent:
         self.model = None
         self.device = "cpu"  # Default to CPU if no CUDA
         self.use_transformers = TRANSFORMERS_AVAILABLE
+        self._compiled = (None, None)  # (schema, _compile_schema(schema))
         
         try:
             if TRANSFORMERS_AVAILABLE:
@@ -40,10 +44,14 @@ class EnhancedNLUAgent:
             logging.warning(f"Failed to load transformers ({e}), falling back to regex")
             self.use_transformers = False
 
-    def _semantic_understanding(self, text: str, schema: Dict) -> Dict:
-        """Use transformers for semantic understanding"""
+    def semantic_score(self, text: str) -> Optional[float]:
+        """
+        Transformer confidence for text, or None if unavailable/failed.
+        Independent of the schema, so callers may run it concurrently with
+        schema loading and pass the result to parse.
+        """
         if not self.use_transformers:
-            return self._regex_fallback(text, schema)
+            return None
         
         try:
             # Tokenize input
@@ -56,18 +64,82 @@ class EnhancedNLUAgent:
                 predictions = torch.softmax(outputs.logits, dim=-1)
             
             # Extract semantic features
-            confidence = torch.max(predictions).item()
+            return torch.max(predictions).item()
+            
+        except Exception as e:
+            logging.error(f"Transformer inference failed: {e}")
+            return None
+
+    def semantic_scores(self, texts: List[str]) -> List[Optional[float]]:
+        """Transformer confidence for several texts in one padded forward pass"""
+        if not self.use_transformers or not texts:
+            return [None] * len(texts)
+        
+        try:
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+            # Sequence classifiers locate each row's last token via pad_token_id
+            if self.model.config.pad_token_id is None:
+                self.model.config.pad_token_id = self.tokenizer.pad_token_id
+            
+            inputs = self.tokenizer(texts, return_tensors="pt", truncation=True,
+                                    max_length=512, padding=True)
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
             
-            # Combine with regex for structured extraction
-            regex_result = self._regex_fallback(text, schema)
-            regex_result["confidence"] = confidence
-            regex_result["semantic_score"] = confidence
+            with torch.no_grad():
+                outputs = self.model(**inputs)
+                predictions = torch.softmax(outputs.logits, dim=-1)
             
-            return regex_result
+            return predictions.max(dim=-1).values.tolist()
             
         except Exception as e:
-            logging.error(f"Transformer inference failed: {e}")
+            logging.error(f"Batched transformer inference failed: {e}")
+            return [self.semantic_score(text) for text in texts]
+
+    @staticmethod
+    def _compile_schema(schema: Dict) -> Dict:
+        """Precompile the per-schema patterns and lookups used by the regex parser"""
+        tables = []
+        for table in schema.keys():
+            table_l = table.lower()
+            singular = None
+            if table_l.endswith("s"):
+                singular = re.compile(r'\b' + re.escape(table_l[:-1]) + r'\b')
+            tables.append((table, re.compile(r'\b' + re.escape(table_l) + r'\b'), singular))
+        
+        columns = {
+            table: [(col, col.lower(), re.compile(r'\b' + re.escape(col.lower()) + r'\b'))
+                    for col in cols]
+            for table, cols in schema.items()
+        }
+        
+        all_columns = {c.upper() for cols in schema.values() for c in cols}
+        
+        return {"tables": tables, "columns": columns, "all_columns": all_columns}
+
+    def _get_compiled_schema(self, schema: Dict) -> Dict:
+        """Compiled schema, rebuilt only when a different schema object is passed"""
+        cached_schema, compiled = self._compiled
+        if cached_schema is not schema:
+            compiled = self._compile_schema(schema)
+            self._compiled = (schema, compiled)
+        return compiled
+
+    def _semantic_understanding(self, text: str, schema: Dict, score=_NOT_SCORED) -> Dict:
+        """Use transformers for semantic understanding"""
+        if not self.use_transformers:
             return self._regex_fallback(text, schema)
+        
+        confidence = self.semantic_score(text) if score is _NOT_SCORED else score
+        if confidence is None:
+            return self._regex_fallback(text, schema)
+        
+        # Combine with regex for structured extraction
+        regex_result = self._regex_fallback(text, schema)
+        regex_result["confidence"] = confidence
+        regex_result["semantic_score"] = confidence
+        
+        return regex_result
 
     def _extract_temporal_intent(self, text: str) -> Dict:
         """Extract temporal expressions and time-based intent"""
@@ -112,12 +184,12 @@ class EnhancedNLUAgent:
         """Enhanced column detection with semantic similarity"""
         detected_columns = []
         text_lower = text.lower()
+        columns = self._get_compiled_schema(schema)["columns"]
         
         # Direct matching
         for table in detected_tables:
-            for col in schema.get(table, []):
-                col_l = col.lower()
-                if re.search(r'\b' + re.escape(col_l) + r'\b', text_lower):
+            for col, _, pattern in columns.get(table, ()):
+                if pattern.search(text_lower):
                     detected_columns.append(col)
         
         # Semantic matching for common terms
@@ -132,8 +204,8 @@ class EnhancedNLUAgent:
         for semantic_term, variations in semantic_mappings.items():
             if semantic_term in text_lower:
                 for table in detected_tables:
-                    for col in schema.get(table, []):
-                        if col.lower() in variations and col not in detected_columns:
+                    for col, col_l, _ in columns.get(table, ()):
+                        if col_l in variations and col not in detected_columns:
                             detected_columns.append(col)
         
         return list(set(detected_columns))
@@ -142,18 +214,16 @@ class EnhancedNLUAgent:
         """Original regex-based parsing as fallback"""
         original_text = text
         text = text.lower()
+        compiled = self._get_compiled_schema(schema)
 
         detected_tables = []
         
         # Detect tables
-        for table in schema.keys():
-            table_l = table.lower()
-            if re.search(r'\b' + re.escape(table_l) + r'\b', text):
+        for table, pattern, singular in compiled["tables"]:
+            if pattern.search(text):
+                detected_tables.append(table)
+            if singular is not None and singular.search(text):
                 detected_tables.append(table)
-            if table_l.endswith("s"):
-                singular = table_l[:-1]
-                if re.search(r'\b' + re.escape(singular) + r'\b', text):
-                    detected_tables.append(table)
 
         detected_tables = list(dict.fromkeys(detected_tables))
         
@@ -186,12 +256,7 @@ class EnhancedNLUAgent:
             where_operator = match.group(2)
             raw_value = match.group(3)
 
-            all_columns = set()
-            for t, cols in schema.items():
-                for c in cols:
-                    all_columns.add(c.upper())
-
-            if candidate_col in all_columns:
+            if candidate_col in compiled["all_columns"]:
                 where_column = candidate_col
                 if re.match(r'^\d+(\.\d+)?$', raw_value):
                     where_value = raw_value
@@ -224,6 +289,11 @@ class EnhancedNLUAgent:
             "method": "transformer" if self.use_transformers else "regex"
         }
 
-    def parse(self, text: str, schema: Dict) -> Dict:
+    def parse(self, text: str, schema: Dict, semantic_score=_NOT_SCORED) -> Dict:
         """Main parsing method with enhanced understanding"""
-        return self._semantic_understanding(text, schema)
+        return self._semantic_understanding(text, schema, semantic_score)
+
+    def parse_batch(self, texts: List[str], schema: Dict) -> List[Dict]:
+        """Parse several questions, sharing one transformer forward pass"""
+        scores = self.semantic_scores(texts)
+        return [self.parse(text, schema, semantic_score=score) for text, score in zip(texts, scores)]
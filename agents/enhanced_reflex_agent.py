@@ -6,19 +6,32 @@ Advanced error correction with ML-based learning and pattern recognition
 import re
 import time
 import logging
+import functools
 from typing import Dict, List, Tuple, Optional, Any
 from datetime import datetime
-from collections import defaultdict
+from collections import Counter, deque
+
+# Error-message normalizers used by the learning strategy
+_ERROR_QUOTED_RE = re.compile(r"'[^']*'")
+_ERROR_NUMBER_RE = re.compile(r'\b\d+\b')
+_ERROR_QUALIFIED_RE = re.compile(r'\b\w+\.\w+\b')
+
+# Lightweight SQL structure scanners shared by the syntax/aggregation fixers
+_SELECT_LIST_RE = re.compile(r'SELECT\s+(.+?)\s+FROM', re.IGNORECASE)
+_AGG_CALL_RE = re.compile(r'(COUNT|SUM|AVG|MAX|MIN)\s*\(', re.IGNORECASE)
+_AGG_FUNCTIONS = ('COUNT', 'SUM', 'AVG', 'MAX', 'MIN')
 
 class EnhancedReflexAgent:
     """Enhanced reflex agent with intelligent error correction and learning capabilities"""
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.correction_history = []
-        self.error_patterns = defaultdict(int)
-        self.success_patterns = defaultdict(int)
+        self.correction_history = deque(maxlen=1000)  # Last 1000 entries
+        self.error_patterns = Counter()
+        self.success_patterns = Counter()
         self.correction_rules = self._load_correction_rules()
+        self._column_inverse = self._build_inverse_mapping(self.correction_rules["column_mapping"])
+        self._table_inverse = self._build_inverse_mapping(self.correction_rules["table_mapping"])
         self.learning_enabled = True
         
     def _load_correction_rules(self) -> Dict[str, Dict]:
@@ -52,6 +65,15 @@ class EnhancedReflexAgent:
             }
         }
     
+    @staticmethod
+    def _build_inverse_mapping(mapping: Dict[str, List[str]]) -> Dict[str, str]:
+        """Build a lowercase variation -> canonical name lookup (first rule wins)"""
+        inverse = {}
+        for correct_name, variations in mapping.items():
+            for variation in variations:
+                inverse.setdefault(variation.lower(), correct_name)
+        return inverse
+    
     def correct_query(self, sql: str, error_message: str, schema: Dict[str, List[str]], 
                    database: str = "default") -> Tuple[str, Dict[str, Any]]:
         """
@@ -78,8 +100,11 @@ class EnhancedReflexAgent:
         start_time = time.time()
         
         try:
+            # Parse the SQL structure once and share it between strategies
+            parsed = self._parse_sql_lite(sql)
+            
             # Strategy 1: Pattern-based error correction
-            corrected_sql, pattern_corrections = self._pattern_based_correction(sql, error_message, schema)
+            corrected_sql, pattern_corrections = self._pattern_based_correction(sql, error_message, schema, parsed)
             if corrected_sql != sql:
                 correction_info["corrections_applied"].extend(pattern_corrections)
                 correction_info["strategy"] = "pattern_based"
@@ -103,7 +128,7 @@ class EnhancedReflexAgent:
             
             # Strategy 4: Fallback intelligent correction
             if corrected_sql == sql:
-                corrected_sql, fallback_corrections = self._fallback_correction(corrected_sql, error_message, schema)
+                corrected_sql, fallback_corrections = self._fallback_correction(corrected_sql, error_message, schema, parsed)
                 if corrected_sql != sql:
                     correction_info["corrections_applied"].extend(fallback_corrections)
                     if correction_info["strategy"]:
@@ -127,7 +152,23 @@ class EnhancedReflexAgent:
             correction_info["execution_time"] = time.time() - start_time
             return sql, correction_info
     
-    def _pattern_based_correction(self, sql: str, error_message: str, schema: Dict[str, List[str]]) -> Tuple[str, List[str]]:
+    @staticmethod
+    def _parse_sql_lite(sql: str) -> Dict[str, Any]:
+        """Scan the SQL once for the structure the correction helpers need"""
+        upper_sql = sql.upper()
+        select_match = _SELECT_LIST_RE.search(sql)
+        select_cols = [col.strip() for col in select_match.group(1).split(',')] if select_match else []
+        
+        return {
+            "upper_sql": upper_sql,
+            "select_cols": select_cols,
+            "non_agg_cols": [col for col in select_cols if not any(agg in col.upper() for agg in _AGG_FUNCTIONS)],
+            "aggs_present": {agg.upper() for agg in _AGG_CALL_RE.findall(sql)},
+            "has_group_by": "GROUP BY" in upper_sql
+        }
+    
+    def _pattern_based_correction(self, sql: str, error_message: str, schema: Dict[str, List[str]],
+                                  parsed: Optional[Dict[str, Any]] = None) -> Tuple[str, List[str]]:
         """Pattern-based error correction using regex and common error patterns"""
         corrected_sql = sql
         corrections = []
@@ -168,7 +209,7 @@ class EnhancedReflexAgent:
         # Error: Syntax error near
         elif "syntax error" in error_message.lower():
             # Common syntax fixes
-            syntax_corrections = self._fix_syntax_errors(sql, error_message)
+            syntax_corrections = self._fix_syntax_errors(sql, error_message, parsed)
             if syntax_corrections:
                 corrected_sql = syntax_corrections[0]  # Take first suggestion
                 corrections.extend(syntax_corrections[1:])
@@ -230,7 +271,8 @@ class EnhancedReflexAgent:
         
         return corrected_sql, corrections
     
-    def _fallback_correction(self, sql: str, error_message: str, schema: Dict[str, List[str]]) -> Tuple[str, List[str]]:
+    def _fallback_correction(self, sql: str, error_message: str, schema: Dict[str, List[str]],
+                             parsed: Optional[Dict[str, Any]] = None) -> Tuple[str, List[str]]:
         """Fallback intelligent correction when other strategies fail"""
         corrected_sql = sql
         corrections = []
@@ -264,7 +306,7 @@ class EnhancedReflexAgent:
         # Fix aggregation function syntax
         if "misuse" in error_message.lower() and "aggregate" in error_message.lower():
             # Fix common aggregation issues
-            corrected_sql, agg_corrections = self._fix_aggregation_errors(sql)
+            corrected_sql, agg_corrections = self._fix_aggregation_errors(sql, parsed)
             corrections.extend(agg_corrections)
         
         return corrected_sql, corrections
@@ -272,9 +314,9 @@ class EnhancedReflexAgent:
     def _suggest_table_correction(self, invalid_table: str, schema: Dict[str, List[str]]) -> Optional[str]:
         """Suggest correction for invalid table name"""
         # Check mapping rules first
-        for correct_name, variations in self.correction_rules["table_mapping"].items():
-            if invalid_table.lower() in [v.lower() for v in variations]:
-                return correct_name
+        correct_name = self._table_inverse.get(invalid_table.lower())
+        if correct_name:
+            return correct_name
         
         # Check for exact matches with different case
         for table_name in schema.keys():
@@ -287,9 +329,9 @@ class EnhancedReflexAgent:
     def _suggest_column_correction(self, invalid_column: str, schema: Dict[str, List[str]]) -> Optional[str]:
         """Suggest correction for invalid column name"""
         # Check mapping rules first
-        for correct_name, variations in self.correction_rules["column_mapping"].items():
-            if invalid_column.lower() in [v.lower() for v in variations]:
-                return correct_name
+        correct_name = self._column_inverse.get(invalid_column.lower())
+        if correct_name:
+            return correct_name
         
         # Check all columns in schema
         all_columns = set()
@@ -354,8 +396,10 @@ class EnhancedReflexAgent:
         
         return similarity
     
-    def _fix_syntax_errors(self, sql: str, error_message: str) -> List[str]:
+    def _fix_syntax_errors(self, sql: str, error_message: str, parsed: Optional[Dict[str, Any]] = None) -> List[str]:
         """Fix common SQL syntax errors"""
+        if parsed is None:
+            parsed = self._parse_sql_lite(sql)
         corrections = []
         corrected_sql = sql
         
@@ -365,17 +409,13 @@ class EnhancedReflexAgent:
             corrections.append("Added missing comma in SELECT list")
         
         # Fix missing GROUP BY for aggregations
-        if "aggregate" in error_message.lower() and "GROUP BY" not in sql.upper():
-            agg_functions = re.findall(r'(COUNT|SUM|AVG|MAX|MIN)\s*\(', sql, re.IGNORECASE)
-            if agg_functions:
+        if "aggregate" in error_message.lower() and not parsed["has_group_by"]:
+            if parsed["aggs_present"]:
                 # Simple heuristic: add GROUP BY for non-aggregated columns
-                select_cols = re.search(r'SELECT\s+(.+?)\s+FROM', sql, re.IGNORECASE)
-                if select_cols:
-                    cols = [col.strip() for col in select_cols.group(1).split(',')]
-                    non_agg_cols = [col for col in cols if not any(agg in col.upper() for agg in ['COUNT', 'SUM', 'AVG', 'MAX', 'MIN'])]
-                    if non_agg_cols:
-                        corrected_sql += f" GROUP BY {non_agg_cols[0]}"
-                        corrections.append(f"Added GROUP BY {non_agg_cols[0]}")
+                non_agg_cols = parsed["non_agg_cols"]
+                if non_agg_cols:
+                    corrected_sql += f" GROUP BY {non_agg_cols[0]}"
+                    corrections.append(f"Added GROUP BY {non_agg_cols[0]}")
         
         # Fix missing quotes in string comparisons
         if re.search(r'=\s*\w+\s*(?:WHERE|AND|OR)', sql):
@@ -387,45 +427,43 @@ class EnhancedReflexAgent:
         
         return [corrected_sql] + corrections
     
-    def _fix_aggregation_errors(self, sql: str) -> Tuple[str, List[str]]:
+    def _fix_aggregation_errors(self, sql: str, parsed: Optional[Dict[str, Any]] = None) -> Tuple[str, List[str]]:
         """Fix common aggregation function errors"""
+        if parsed is None:
+            parsed = self._parse_sql_lite(sql)
         corrected_sql = sql
         corrections = []
+        upper_sql = parsed["upper_sql"]
+        non_agg_cols = parsed["non_agg_cols"]
         
         # Fix COUNT(*) vs COUNT(column)
-        if "COUNT(" in sql.upper() and "GROUP BY" in sql.upper():
+        if "COUNT(" in upper_sql and parsed["has_group_by"]:
             # Check if we're using COUNT(*) with GROUP BY
-            if "COUNT(*)" in sql.upper():
+            if "COUNT(*)" in upper_sql:
                 # Try to find a non-aggregated column to use
-                select_match = re.search(r'SELECT\s+(.+?)\s+FROM', sql, re.IGNORECASE)
-                if select_match:
-                    cols = [col.strip() for col in select_match.group(1).split(',')]
-                    non_agg_cols = [col for col in cols if not any(agg in col.upper() for agg in ['COUNT', 'SUM', 'AVG', 'MAX', 'MIN'])]
-                    if non_agg_cols:
-                        corrected_sql = corrected_sql.replace("COUNT(*)", f"COUNT({non_agg_cols[0]})")
-                        corrections.append(f"Changed COUNT(*) to COUNT({non_agg_cols[0]})")
+                if non_agg_cols:
+                    corrected_sql = corrected_sql.replace("COUNT(*)", f"COUNT({non_agg_cols[0]})")
+                    corrections.append(f"Changed COUNT(*) to COUNT({non_agg_cols[0]})")
         
         # Fix AVG without GROUP BY
-        if "AVG(" in sql.upper() and "GROUP BY" not in sql.upper():
-            select_match = re.search(r'SELECT\s+(.+?)\s+FROM', sql, re.IGNORECASE)
-            if select_match:
-                cols = [col.strip() for col in select_match.group(1).split(',')]
-                non_agg_cols = [col for col in cols if not any(agg in col.upper() for agg in ['COUNT', 'SUM', 'AVG', 'MAX', 'MIN'])]
-                if non_agg_cols:
-                    corrected_sql += f" GROUP BY {non_agg_cols[0]}"
-                    corrections.append(f"Added GROUP BY {non_agg_cols[0]} for AVG function")
+        if "AVG(" in upper_sql and not parsed["has_group_by"]:
+            if non_agg_cols:
+                corrected_sql += f" GROUP BY {non_agg_cols[0]}"
+                corrections.append(f"Added GROUP BY {non_agg_cols[0]} for AVG function")
         
         return corrected_sql, corrections
     
-    def _extract_error_pattern(self, error_message: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=2048)
+    def _extract_error_pattern(error_message: str) -> str:
         """Extract normalized error pattern for learning"""
         # Normalize error message for pattern matching
         pattern = error_message.lower()
         
         # Remove specific values and keep structure
-        pattern = re.sub(r"'[^']*'", "'X'", pattern)  # Replace quoted values
-        pattern = re.sub(r'\b\d+\b', 'N', pattern)  # Replace numbers
-        pattern = re.sub(r'\b\w+\.\w+\b', 'table.column', pattern)  # Replace table.column
+        pattern = _ERROR_QUOTED_RE.sub("'X'", pattern)  # Replace quoted values
+        pattern = _ERROR_NUMBER_RE.sub('N', pattern)  # Replace numbers
+        pattern = _ERROR_QUALIFIED_RE.sub('table.column', pattern)  # Replace table.column
         
         return pattern
     
@@ -482,10 +520,6 @@ class EnhancedReflexAgent:
         else:
             self.error_patterns[error_pattern] += 1
         
-        # Keep history manageable
-        if len(self.correction_history) > 1000:
-            self.correction_history = self.correction_history[-1000:]
-        
         self.logger.info(f"Reflex correction applied: {correction_info['strategy']} with confidence {correction_info['confidence']:.2f}")
     
     def get_correction_statistics(self) -> Dict[str, Any]:
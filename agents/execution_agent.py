@@ -21,12 +21,12 @@ class ExecutionAgent:
             columns = ", ".join([f"{h} TEXT" for h in headers])
             cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({columns})")
 
-            # Insert rows
-            for row in reader:
-                placeholders = ",".join(["?"] * len(row))
-                cursor.execute(
-                    f"INSERT INTO {table_name} VALUES ({placeholders})", row
-                )
+            # Insert rows (executemany drains the C csv reader directly,
+            # reusing one prepared statement instead of a Python loop)
+            placeholders = ",".join(["?"] * len(headers))
+            cursor.executemany(
+                f"INSERT INTO {table_name} VALUES ({placeholders})", reader
+            )
 
         conn.commit()
         print(f"✅ Imported {csv_path} as table {table_name}")
@@ -73,10 +73,10 @@ class ExecutionAgent:
     # =========================
     # Execute SQL using given connection
     # =========================
-    def execute(self, sql, conn):
+    def execute(self, sql, conn, params=None):
         try:
             cursor = conn.cursor()
-            cursor.execute(sql)
+            cursor.execute(sql, params or ())
 
             # If it's not a SELECT (e.g., UPDATE/INSERT)
             if cursor.description is None:
@@ -93,7 +93,7 @@ class ExecutionAgent:
                 table.add_column(col)
 
             for row in rows:
-                table.add_row(*[str(x) for x in row])
+                table.add_row(*map(str, row))
 
             console.print(table)
 
@@ -1,14 +1,17 @@
 class ExplanationAgent:
     def explain(self, sql, intent):
-        explanation = "I understood your question and generated the following SQL query:\n"
-        explanation += sql + "\n\n"
+        parts = [
+            "I understood your question and generated the following SQL query:",
+            sql,
+            "",
+        ]
 
         if intent.get("aggregation"):
-            explanation += "This query uses an aggregation function to compute the result.\n"
+            parts.append("This query uses an aggregation function to compute the result.")
 
         if "where" in sql.lower():
-            explanation += "It also applies a filtering condition based on your question.\n"
+            parts.append("It also applies a filtering condition based on your question.")
 
-        explanation += "The query was validated by executing it on the database."
+        parts.append("The query was validated by executing it on the database.")
 
-        return explanation
\ No newline at end of file
+        return "\n".join(parts)
@@ -1,6 +1,119 @@
 import re
+import functools
+
+# =========================
+# Precompiled static patterns
+# =========================
+_WORD_RE = re.compile(r'\w+')
+_HOW_MANY_RE = re.compile(r'\bhow many\b')
+_WHERE_RE = re.compile(r'\b(\w+)\b\s*(=|>|<)\s*([\w\.]+)')
+_NUMERIC_RE = re.compile(r'^\d+(\.\d+)?$')
+
+# Operator phrases, normalized in a single substitution pass
+_OPERATOR_PHRASES = {"greater than": ">", "less than": "<", "equal to": "="}
+_OPERATOR_PHRASE_RE = re.compile("|".join(re.escape(p) for p in _OPERATOR_PHRASES))
+
+
+def _normalize_operator(match):
+    return _OPERATOR_PHRASES[match.group(0)]
+
+
+@functools.lru_cache(maxsize=256)
+def _original_value_pattern(column):
+    """Pattern recovering the original-cased WHERE value for a column"""
+    return re.compile(r'\b' + re.escape(column) + r'\b\s*(=|>|<)\s*([\w\.]+)', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=8)
+def _schema_name_matcher(names):
+    """
+    Build a single-pass matcher for a tuple of lowercase schema names.
+
+    All names go into one alternation (longest first) behind a zero-width
+    lookahead, so one finditer pass reports every whole-word hit, including
+    overlapping ones. A name that is a whole-word prefix of a longer name
+    ("order" in "order items") starts at the same position and would be
+    shadowed, so those are recorded per name and added back on a hit.
+    """
+    unique = sorted(set(names), key=len, reverse=True)
+    if not unique:
+        return None, {}
+    pattern = re.compile(r'(?=\b(' + '|'.join(re.escape(n) for n in unique) + r')\b)')
+
+    shadowed = {}
+    for name in unique:
+        shadowed[name] = tuple(
+            other for other in unique
+            if len(other) < len(name) and name.startswith(other)
+            and not (name[len(other)].isalnum() or name[len(other)] == "_")
+        )
+
+    return pattern, shadowed
+
+
+def _scan_names(text, matcher):
+    """Return the set of schema names occurring as whole words in text"""
+    pattern, shadowed = matcher
+    found = set()
+    if pattern is None:
+        return found
+    for m in pattern.finditer(text):
+        name = m.group(1)
+        found.add(name)
+        found.update(shadowed[name])
+    return found
+
+
+@functools.lru_cache(maxsize=8)
+def _compile_schema(layout):
+    """
+    Flatten a schema layout ((table, (col, ...)), ...) into everything parse
+    needs, once per distinct schema: lowercase table aliases (name plus
+    simple singular), lowercase column names per table, the upper-cased
+    column set used for WHERE validation, the single-word names (looked up
+    in the question's token set) and a matcher for the remaining phrases.
+    """
+    tables = []
+    columns = {}
+    columns_upper = set()
+    names = []
+
+    for table, cols in layout:
+        table_l = table.lower()
+        # Also allow simple singular form (STUDENT vs students)
+        aliases = (table_l, table_l[:-1]) if table_l.endswith("s") else (table_l,)
+        tables.append((table, aliases))
+        names.extend(aliases)
+
+        columns[table] = tuple((c, c.lower()) for c in cols)
+        columns_upper.update(c.upper() for c in cols)
+        names.extend(c.lower() for c in cols)
+
+    word_names = frozenset(n for n in names if _WORD_RE.fullmatch(n))
+    phrases = tuple(n for n in names if n not in word_names)
+
+    return {
+        "tables": tuple(tables),
+        "columns": columns,
+        "columns_upper": frozenset(columns_upper),
+        "word_names": word_names,
+        "matcher": _schema_name_matcher(phrases)
+    }
+
 
 class NLUAgent:
+    def __init__(self):
+        # (schema object, compiled form) for the last schema parsed against
+        self._compiled = (None, None)
+
+    def _get_compiled_schema(self, schema):
+        cached_schema, compiled = self._compiled
+        if cached_schema is not schema:
+            layout = tuple((t, tuple(cols)) for t, cols in schema.items())
+            compiled = _compile_schema(layout)
+            self._compiled = (schema, compiled)
+        return compiled
+
     def parse(self, text, schema):
         original_text = text
         text = text.lower()
@@ -8,22 +121,21 @@ class NLUAgent:
         detected_tables = []
         detected_columns = []
 
+        # Tokenize once; single-word names are set lookups, and only
+        # multi-word names need a (single) regex scan
+        tokens = set(_WORD_RE.findall(text))
+        compiled = self._get_compiled_schema(schema)
+        found = compiled["word_names"] & tokens
+        found |= _scan_names(text, compiled["matcher"])
+
         # =========================
         # 1. Detect tables (STRICT)
         # =========================
-        for table in schema.keys():
-            table_l = table.lower()
-
+        for table, aliases in compiled["tables"]:
             # Match full word only
-            if re.search(r'\b' + re.escape(table_l) + r'\b', text):
+            if any(alias in found for alias in aliases):
                 detected_tables.append(table)
 
-            # Also allow simple singular form (STUDENT vs students)
-            if table_l.endswith("s"):
-                singular = table_l[:-1]
-                if re.search(r'\b' + re.escape(singular) + r'\b', text):
-                    detected_tables.append(table)
-
         # Deduplicate
         detected_tables = list(dict.fromkeys(detected_tables))
 
@@ -31,9 +143,8 @@ class NLUAgent:
         # 2. Detect columns (ONLY from detected tables)
         # =========================
         for table in detected_tables:
-            for col in schema[table]:
-                col_l = col.lower()
-                if re.search(r'\b' + re.escape(col_l) + r'\b', text):
+            for col, col_l in compiled["columns"][table]:
+                if col_l in found:
                     detected_columns.append(col)
 
         # Deduplicate
@@ -43,13 +154,13 @@ class NLUAgent:
         # 3. Detect aggregation (STRICT)
         # =========================
         aggregation = None
-        if re.search(r'\bcount\b|\bhow many\b', text):
+        if "count" in tokens or _HOW_MANY_RE.search(text):
             aggregation = "COUNT"
-        elif re.search(r'\baverage\b|\bavg\b', text):
+        elif "average" in tokens or "avg" in tokens:
             aggregation = "AVG"
-        elif re.search(r'\bmaximum\b|\bmax\b', text):
+        elif "maximum" in tokens or "max" in tokens:
             aggregation = "MAX"
-        elif re.search(r'\bminimum\b|\bmin\b', text):
+        elif "minimum" in tokens or "min" in tokens:
             aggregation = "MIN"
 
         # =========================
@@ -60,10 +171,10 @@ class NLUAgent:
         where_value = None
 
         # Normalize operators
-        temp = text.replace("greater than", ">").replace("less than", "<").replace("equal to", "=")
+        temp = _OPERATOR_PHRASE_RE.sub(_normalize_operator, text)
 
         # Only allow simple patterns: col > value, col = value, col < value
-        match = re.search(r'\b(\w+)\b\s*(=|>|<)\s*([\w\.]+)', temp)
+        match = _WHERE_RE.search(temp)
 
         if match:
             candidate_col = match.group(1).upper()
@@ -71,20 +182,15 @@ class NLUAgent:
             raw_value = match.group(3)
 
             # Check that column exists in schema (any table)
-            all_columns = set()
-            for t, cols in schema.items():
-                for c in cols:
-                    all_columns.add(c.upper())
-
-            if candidate_col in all_columns:
+            if candidate_col in compiled["columns_upper"]:
                 where_column = candidate_col
 
                 # If numeric → keep as is
-                if re.match(r'^\d+(\.\d+)?$', raw_value):
+                if _NUMERIC_RE.match(raw_value):
                     where_value = raw_value
                 else:
                     # Recover original casing from original text
-                    original_match = re.search(r'\b' + re.escape(candidate_col) + r'\b\s*(=|>|<)\s*([\w\.]+)', original_text, re.IGNORECASE)
+                    original_match = _original_value_pattern(candidate_col).search(original_text)
                     if original_match:
                         real_value = original_match.group(2)
                         where_value = f"'{original_match.group(2)}'"
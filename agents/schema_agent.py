@@ -1,40 +1,101 @@
 import sqlite3
+
+
+def build_schema_index(schema):
+    """
+    Precompute lookup structures for a {table: [columns]} schema:
+    per-table column sets and a column -> tables inverted index.
+    """
+    table_columns = {table: set(cols) for table, cols in schema.items()}
+    column_index = {}
+    for table, cols in schema.items():
+        for col in cols:
+            column_index.setdefault(col, set()).add(table)
+
+    return {
+        "table_columns": table_columns,
+        "column_index": {col: frozenset(ts) for col, ts in column_index.items()}
+    }
+
+
+# One pass over sqlite_master with the table-valued pragma functions
+# instead of two PRAGMA round-trips per table
+_COLUMNS_SQL = (
+    "SELECT m.name, p.name FROM sqlite_master m "
+    "JOIN pragma_table_info(m.name) p "
+    "WHERE m.type='table' ORDER BY m.rowid, p.cid"
+)
+_FOREIGN_KEYS_SQL = (
+    "SELECT m.name, p.\"from\", p.\"table\", p.\"to\" FROM sqlite_master m "
+    "JOIN pragma_foreign_key_list(m.name) p "
+    "WHERE m.type='table'"
+)
+
+
 class SchemaAgent:
-    def __init__(self, db_path):
+    def __init__(self, db_path=None, db_manager=None, connection_name="default"):
+        # Either a bare SQLite file path, or a DatabaseManager whose cached
+        # get_schema is shared with the rest of the pipeline
+        if db_path is None and db_manager is None:
+            raise ValueError("SchemaAgent needs a db_path or a db_manager")
+
         self.db_path = db_path
+        self.db_manager = db_manager
+        self.connection_name = connection_name
+        self._conn = None
+        self._managed = (None, None)
+
+    def _get_connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
 
     def get_schema(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        if self.db_manager is not None:
+            return self._get_managed_schema()
+
+        cursor = self._get_connection().cursor()
 
         schema = {}
         foreign_keys = []
 
-        # Get tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = cursor.fetchall()
-
-        for (table_name,) in tables:
-            # Columns
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns_info = cursor.fetchall()
-            columns = [col[1] for col in columns_info]
-            schema[table_name] = columns
-
-            # Foreign keys
-            cursor.execute(f"PRAGMA foreign_key_list({table_name})")
-            fk_info = cursor.fetchall()
-            for fk in fk_info:
-                foreign_keys.append({
-                    "from_table": table_name,
-                    "from_column": fk[3],
-                    "to_table": fk[2],
-                    "to_column": fk[4]
-                })
-
-        conn.close()
+        # Columns for every table
+        for table_name, column in cursor.execute(_COLUMNS_SQL):
+            schema.setdefault(table_name, []).append(column)
+
+        # Foreign keys for every table
+        for table_name, from_column, to_table, to_column in cursor.execute(_FOREIGN_KEYS_SQL):
+            foreign_keys.append({
+                "from_table": table_name,
+                "from_column": from_column,
+                "to_table": to_table,
+                "to_column": to_column
+            })
+
+        cursor.close()
 
         return {
             "tables": schema,
-            "relations": foreign_keys
-        }
\ No newline at end of file
+            "relations": foreign_keys,
+            **build_schema_index(schema)
+        }
+
+    def _get_managed_schema(self):
+        schema, relations = self.db_manager.get_schema(self.connection_name)
+
+        # The manager hands back the same cached dict until it is invalidated,
+        # so the derived result is rebuilt only when that reference changes
+        cached_schema, result = self._managed
+        if cached_schema is not schema:
+            result = {
+                "tables": schema,
+                "relations": relations,
+                **build_schema_index(schema)
+            }
+            self._managed = (schema, result)
+        return result
@@ -1,77 +1,77 @@
-import random
+import re
+import sqlite3
 
-class SQLPlannerAgent:
+from agents.schema_agent import build_schema_index
 
-    # =========================
-    # Helper: find column that contains value
-    # =========================
-    def find_column_for_value(self, conn, tables, schema, value):
-        raw_value = value.strip("'")
+_NO_TABLES = frozenset()
+_NUMERIC_RE = re.compile(r'^\d+(\.\d+)?$')
 
-        cursor = conn.cursor()
+# Bind parameter used for the WHERE value in parameterized SQL
+WHERE_PARAM = "where_value"
 
-        for table in tables:
-            for col in schema.get(table, []):
-                try:
-                    q = f"SELECT 1 FROM {table} WHERE {col} = ? LIMIT 1"
-                    cursor.execute(q, (raw_value,))
-                    if cursor.fetchone():
-                        return table, col
-                except:
-                    pass
 
-        return None, None
+def _bind_value(literal):
+    # Turn the NLU's SQL literal ('text' or 123 / 1.5) into a Python value
+    if isinstance(literal, str):
+        if len(literal) >= 2 and literal[0] == literal[-1] == "'":
+            return literal[1:-1]
+        if _NUMERIC_RE.match(literal):
+            return float(literal) if "." in literal else int(literal)
+    return literal
 
-    # =========================
-    # Main SQL generator (SAFE)
-    # =========================
-    def generate_sql(self, intent, schema, relations, conn):
 
-        tables = intent.get("tables") or []
-        main_table = intent.get("table")
-        columns = intent.get("columns") or []
-        aggregation = intent.get("aggregation")
+class SQLPlannerAgent:
 
-        where_column = intent.get("where_column")
-        where_operator = intent.get("where_operator")
-        where_value = intent.get("where_value")
+    def __init__(self):
+        # (table, columns) shape -> cached UNION ALL probe SQL
+        self._probe_cache = {}
+        # (schema object, its lookup index) for the last schema planned against
+        self._schema_index = (None, None)
+        # (schema, relations, {intent shape -> SQL template}) for the same
+        self._templates = (None, None, {})
+        # (relations list, {(from_table, to_table) -> (position, from_col, to_col)})
+        self._relation_index = (None, {})
 
-        # =========================
-        # HARD BLOCK: No table
-        # =========================
-        if not tables and not main_table:
-            return None
-
-        # Normalize tables
-        if not tables:
-            tables = [main_table]
+    # =========================
+    # Helper: per-schema lookup index (rebuilt only when the schema changes)
+    # =========================
+    def _get_schema_index(self, schema):
+        cached_schema, index = self._schema_index
+        if cached_schema is not schema:
+            index = build_schema_index(schema)
+            self._schema_index = (schema, index)
+        return index
 
-        # =========================
-        # Validate tables exist
-        # =========================
-        for t in tables:
-            if t not in schema:
-                return None
+    # =========================
+    # Helper: SQL templates per intent shape (reset when schema/relations change)
+    # =========================
+    def _get_template_cache(self, schema, relations):
+        cached_schema, cached_relations, templates = self._templates
+        if cached_schema is not schema or cached_relations is not relations:
+            templates = {}
+            self._templates = (schema, relations, templates)
+        return templates
 
-        # =========================
-        # Validate columns exist
-        # =========================
-        for c in columns:
-            if not any(c in schema[t] for t in tables):
-                return None
+    # =========================
+    # Helper: FK lookup by table pair (rebuilt only when relations change)
+    # =========================
+    def _get_relation_index(self, relations):
+        cached_relations, index = self._relation_index
+        if cached_relations is not relations:
+            index = {}
+            for position, rel in enumerate(relations):
+                # Later relations win, as with the original linear scan
+                index[(rel["from_table"], rel["to_table"])] = (
+                    position, rel["from_column"], rel["to_column"]
+                )
+            self._relation_index = (relations, index)
+        return index
 
-        # =========================
-        # WHERE validation
-        # =========================
-        if where_column:
-            if not any(where_column in schema[t] for t in tables):
-                # Try auto-fix using value lookup
-                new_table, new_col = self.find_column_for_value(conn, tables, schema, where_value or "")
-                if new_col:
-                    print(f"⚠️ Auto-corrected WHERE column: {where_column} → {new_col}")
-                    where_column = new_col
-                else:
-                    return None
+    # =========================
+    # Helper: render the SQL for one intent shape, up to the WHERE value
+    # =========================
+    def _build_template(self, tables, columns, aggregation, where_column,
+                        where_operator, has_where, table_columns, relations):
 
         # =========================
         # CASE 1: SINGLE TABLE
@@ -94,8 +94,8 @@ class SQLPlannerAgent:
             sql = f"SELECT {select_part} FROM {table}"
 
             # WHERE
-            if where_column and where_operator and where_value:
-                sql += f" WHERE {where_column} {where_operator} {where_value}"
+            if has_where:
+                sql += f" WHERE {where_column} {where_operator} "
 
             return sql
 
@@ -107,11 +107,13 @@ class SQLPlannerAgent:
 
             join_condition = None
 
-            for rel in relations:
-                if rel["from_table"] == t1 and rel["to_table"] == t2:
-                    join_condition = f"{t1}.{rel['from_column']} = {t2}.{rel['to_column']}"
-                elif rel["from_table"] == t2 and rel["to_table"] == t1:
-                    join_condition = f"{t2}.{rel['from_column']} = {t1}.{rel['to_column']}"
+            rel_index = self._get_relation_index(relations)
+            forward = rel_index.get((t1, t2))
+            backward = rel_index.get((t2, t1))
+            if backward and (not forward or backward[0] > forward[0]):
+                join_condition = f"{t2}.{backward[1]} = {t1}.{backward[2]}"
+            elif forward:
+                join_condition = f"{t1}.{forward[1]} = {t2}.{forward[2]}"
 
             # ❌ No relation → refuse
             if join_condition is None:
@@ -122,9 +124,9 @@ class SQLPlannerAgent:
 
             if columns:
                 for col in columns:
-                    if col in schema[t1]:
+                    if col in table_columns[t1]:
                         select_cols.append(f"{t1}.{col}")
-                    elif col in schema[t2]:
+                    elif col in table_columns[t2]:
                         select_cols.append(f"{t2}.{col}")
                     else:
                         return None
@@ -141,11 +143,11 @@ JOIN {t2} ON {join_condition}
 """.strip()
 
             # WHERE
-            if where_column and where_operator and where_value:
-                if where_column in schema[t1]:
-                    sql += f"\nWHERE {t1}.{where_column} {where_operator} {where_value}"
-                elif where_column in schema[t2]:
-                    sql += f"\nWHERE {t2}.{where_column} {where_operator} {where_value}"
+            if has_where:
+                if where_column in table_columns[t1]:
+                    sql += f"\nWHERE {t1}.{where_column} {where_operator} "
+                elif where_column in table_columns[t2]:
+                    sql += f"\nWHERE {t2}.{where_column} {where_operator} "
                 else:
                     return None
 
@@ -154,4 +156,166 @@ JOIN {t2} ON {join_condition}
         # =========================
         # ❌ MORE THAN 2 TABLES NOT SUPPORTED
         # =========================
-        return None
\ No newline at end of file
+        return None
+
+    # =========================
+    # Helper: build one UNION ALL probe for all (table, column) pairs
+    # =========================
+    def _build_value_probe(self, tables, schema):
+        key = tuple((t, tuple(schema.get(t, []))) for t in tables)
+        if key in self._probe_cache:
+            return self._probe_cache[key]
+
+        pairs = [(table, col) for table, cols in key for col in cols]
+        branches = []
+        for i, (table, col) in enumerate(pairs):
+            t_lit = table.replace("'", "''")
+            c_lit = col.replace("'", "''")
+            # SQLite only accepts LIMIT on a compound member inside a subquery
+            branches.append(
+                f"SELECT * FROM (SELECT {i} AS ord, '{t_lit}' AS t, '{c_lit}' AS c "
+                f"FROM {table} WHERE {col} = :v LIMIT 1)"
+            )
+
+        sql = None
+        if branches:
+            sql = " UNION ALL ".join(branches) + " ORDER BY ord LIMIT 1"
+
+        self._probe_cache[key] = sql
+        return sql
+
+    # =========================
+    # Helper: find column that contains value
+    # =========================
+    def find_column_for_value(self, conn, tables, schema, value):
+        raw_value = value.strip("'")
+
+        if conn is None:
+            return None, None
+
+        cursor = conn.cursor()
+
+        # Fast path: a single round-trip probing every column at once
+        probe_sql = self._build_value_probe(tables, schema)
+        if probe_sql is None:
+            return None, None
+        try:
+            cursor.execute(probe_sql, {"v": raw_value})
+            row = cursor.fetchone()
+            return (row[1], row[2]) if row else (None, None)
+        except sqlite3.Error:
+            # e.g. a stale column name or too many compound terms;
+            # fall back to probing columns one by one
+            pass
+
+        for table in tables:
+            for col in schema.get(table, []):
+                try:
+                    q = f"SELECT 1 FROM {table} WHERE {col} = ? LIMIT 1"
+                    cursor.execute(q, (raw_value,))
+                    if cursor.fetchone():
+                        return table, col
+                except sqlite3.Error:
+                    pass
+
+        return None, None
+
+    # =========================
+    # Main SQL generator (SAFE)
+    # =========================
+    def generate_sql(self, intent, schema, relations, conn):
+        template, where_value = self._plan(intent, schema, relations, conn)
+        if template is None:
+            return None
+
+        return template if where_value is None else f"{template}{where_value}"
+
+    # =========================
+    # Same SQL with the WHERE value as a bind parameter
+    # =========================
+    def generate_parameterized_sql(self, intent, schema, relations, conn):
+        template, where_value = self._plan(intent, schema, relations, conn)
+        if template is None:
+            return None, {}
+
+        if where_value is None:
+            return template, {}
+        return f"{template}:{WHERE_PARAM}", {WHERE_PARAM: _bind_value(where_value)}
+
+    # =========================
+    # Validate the intent and return (SQL template, WHERE value or None)
+    # =========================
+    def _plan(self, intent, schema, relations, conn):
+
+        tables = intent.get("tables") or []
+        main_table = intent.get("table")
+        columns = intent.get("columns") or []
+        aggregation = intent.get("aggregation")
+
+        where_column = intent.get("where_column")
+        where_operator = intent.get("where_operator")
+        where_value = intent.get("where_value")
+
+        # =========================
+        # HARD BLOCK: No table
+        # =========================
+        if not tables and not main_table:
+            return None, None
+
+        # Normalize tables
+        if not tables:
+            tables = [main_table]
+
+        # =========================
+        # Validate tables exist
+        # =========================
+        for t in tables:
+            if t not in schema:
+                return None, None
+
+        index = self._get_schema_index(schema)
+        table_columns = index["table_columns"]
+        column_index = index["column_index"]
+
+        # =========================
+        # Validate columns exist
+        # =========================
+        for c in columns:
+            if column_index.get(c, _NO_TABLES).isdisjoint(tables):
+                return None, None
+
+        # =========================
+        # WHERE validation
+        # =========================
+        if where_column:
+            if column_index.get(where_column, _NO_TABLES).isdisjoint(tables):
+                # Try auto-fix using value lookup
+                new_table, new_col = self.find_column_for_value(conn, tables, schema, where_value or "")
+                if new_col:
+                    print(f"⚠️ Auto-corrected WHERE column: {where_column} → {new_col}")
+                    where_column = new_col
+                else:
+                    return None, None
+
+        # =========================
+        # Render from the cached template for this intent shape
+        # =========================
+        has_where = bool(where_column and where_operator and where_value)
+        shape = (tuple(tables), tuple(columns), aggregation,
+                 where_column if has_where else None,
+                 where_operator if has_where else None)
+
+        templates = self._get_template_cache(schema, relations)
+        if shape in templates:
+            template = templates[shape]
+        else:
+            template = self._build_template(
+                tables, columns, aggregation, where_column, where_operator,
+                has_where, table_columns, relations
+            )
+            templates[shape] = template
+
+        if template is None:
+            return None, None
+
+        return template, (where_value if has_where else None)
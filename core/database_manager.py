@@ -1,13 +1,15 @@
-from sqlalchemy import create_engine, text, inspect, MetaData, Table
+from sqlalchemy import create_engine, event, text, inspect, MetaData, Table
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 import sqlite3
-import psycopg2
-import pymysql
-from typing import Dict, List, Tuple, Any, Optional, Union
+from typing import Dict, List, Tuple, Any, Optional, Union, Iterator
 import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from contextlib import contextmanager
 from urllib.parse import urlparse
+from core.sqlite_pool import apply_sqlite_pragmas, STATEMENT_CACHE_SIZE
 
 class DatabaseManager:
     """Multi-database support manager with connection pooling and federation"""
@@ -18,6 +20,15 @@ class DatabaseManager:
         self.session_makers = {}
         self.db_types = {}
         self.logger = logging.getLogger(__name__)
+        
+        # Compiled EXPLAIN statements reused by validate_query
+        self._explain_prefix: Dict[str, str] = {}
+        self._validate_cache: Dict[Tuple[str, str], Any] = {}
+        self.validate_cache_size = 1024
+        
+        # Introspected schema per connection: name -> (schema, relationships, timestamp)
+        self._schema_cache: Dict[str, Tuple[Dict[str, List[str]], List[Dict], float]] = {}
+        self.schema_ttl = 60.0
     
     def add_connection(self, name: str, connection_string: str, db_type: str = "auto") -> bool:
         """
@@ -41,9 +52,11 @@ class DatabaseManager:
                 engine = create_engine(
                     connection_string,
                     poolclass=StaticPool,
-                    connect_args={"check_same_thread": False},
+                    connect_args={"check_same_thread": False,
+                                  "cached_statements": STATEMENT_CACHE_SIZE},
                     echo=False
                 )
+                event.listen(engine, "connect", lambda dbapi_conn, _: apply_sqlite_pragmas(dbapi_conn))
             elif db_type == "postgresql":
                 engine = create_engine(
                     connection_string,
@@ -69,6 +82,8 @@ class DatabaseManager:
             self.engines[name] = engine
             self.session_makers[name] = sessionmaker(bind=engine)
             self.db_types[name] = db_type
+            self._explain_prefix[name] = "EXPLAIN QUERY PLAN " if db_type == "sqlite" else "EXPLAIN "
+            self._schema_cache.pop(name, None)
             
             self.logger.info(f"Successfully connected to {name} ({db_type})")
             return True
@@ -117,9 +132,16 @@ class DatabaseManager:
         """
         Get database schema including tables, columns, and relationships
         
+        Results are cached per connection for ``schema_ttl`` seconds; call
+        ``invalidate_schema`` after DDL to pick up changes immediately.
+        
         Returns:
             Tuple of (schema_dict, relationships_list)
         """
+        cached = self._schema_cache.get(connection_name)
+        if cached is not None and time.monotonic() - cached[2] < self.schema_ttl:
+            return cached[0], cached[1]
+        
         try:
             with self.get_connection(connection_name) as conn:
                 inspector = inspect(conn)
@@ -144,23 +166,74 @@ class DatabaseManager:
                             'to_column': fk['referred_columns'][0]
                         })
                 
+                self._schema_cache[connection_name] = (schema, relationships, time.monotonic())
                 return schema, relationships
                 
         except Exception as e:
             self.logger.error(f"Failed to get schema for {connection_name}: {e}")
             return {}, []
     
-    def execute_query(self, connection_name: str, query: str) -> List[Dict]:
-        """Execute SQL query and return results"""
+    def invalidate_schema(self, connection_name: Optional[str] = None):
+        """Drop cached schema for one connection, or for all when no name is given"""
+        if connection_name is None:
+            self._schema_cache.clear()
+        else:
+            self._schema_cache.pop(connection_name, None)
+    
+    def execute_query(self, connection_name: str, query: str, chunk_size: int = 1000,
+                      params: Optional[Dict[str, Any]] = None) -> List[Dict]:
+        """Execute SQL query (with optional bind parameters) and return results"""
+        return [row for chunk in self.iter_query(connection_name, query, chunk_size, params) for row in chunk]
+    
+    def iter_query(self, connection_name: str, query: str, chunk_size: int = 1000,
+                   params: Optional[Dict[str, Any]] = None) -> Iterator[List[Dict]]:
+        """
+        Execute SQL query and yield results in chunks of up to chunk_size rows
+        
+        Uses a streaming (server-side) cursor where the driver supports one, so
+        large result sets are never fully materialized. The connection stays
+        open until the generator is exhausted or closed.
+        """
         try:
             with self.get_connection(connection_name) as conn:
-                result = conn.execute(text(query))
+                result = conn.execution_options(
+                    stream_results=True, yield_per=chunk_size
+                ).execute(text(query), params or {})
                 
-                # Convert to list of dictionaries
-                columns = result.keys()
-                rows = result.fetchall()
+                # Convert to dictionaries, resolving the (interned) keys once
+                # per result instead of going through a mapping per row
+                columns = tuple(sys.intern(str(key)) for key in result.keys())
+                for partition in result.partitions(chunk_size):
+                    yield [dict(zip(columns, row)) for row in partition]
                 
-                return [dict(zip(columns, row)) for row in rows]
+        except Exception as e:
+            self.logger.error(f"Query execution failed on {connection_name}: {e}")
+            raise e
+    
+    def execute_query_columnar(self, connection_name: str, query: str,
+                               params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Execute SQL query and return column names plus raw row tuples, without per-row dicts"""
+        try:
+            with self.get_connection(connection_name) as conn:
+                result = conn.execute(text(query), params or {})
+                return {'columns': list(result.keys()), 'rows': result.fetchall()}
+                
+        except Exception as e:
+            self.logger.error(f"Query execution failed on {connection_name}: {e}")
+            raise e
+    
+    def count_query_rows(self, connection_name: str, query: str, chunk_size: int = 1000,
+                         params: Optional[Dict[str, Any]] = None) -> int:
+        """Execute SQL query and count its rows, streaming one chunk at a time"""
+        try:
+            with self.get_connection(connection_name) as conn:
+                result = conn.execution_options(
+                    stream_results=True, yield_per=chunk_size
+                ).execute(text(query), params or {})
+                
+                if not result.returns_rows:
+                    return 0
+                return sum(len(partition) for partition in result.partitions(chunk_size))
                 
         except Exception as e:
             self.logger.error(f"Query execution failed on {connection_name}: {e}")
@@ -181,6 +254,9 @@ class DatabaseManager:
         """
         Execute federated queries across multiple databases
         
+        Queries run concurrently (one thread per connection, at most 16);
+        the returned dict keeps the order of ``queries``.
+        
         Args:
             queries: Dictionary of connection_name -> query pairs
         
@@ -190,11 +266,26 @@ class DatabaseManager:
         results = {}
         errors = {}
         
-        for connection_name, query in queries.items():
-            try:
-                results[connection_name] = self.execute_query(connection_name, query)
-            except Exception as e:
-                errors[connection_name] = str(e)
+        if not queries:
+            return results
+        
+        completed = {}
+        with ThreadPoolExecutor(max_workers=min(len(queries), 16)) as executor:
+            futures = {
+                executor.submit(self.execute_query, connection_name, query): connection_name
+                for connection_name, query in queries.items()
+            }
+            for future in as_completed(futures):
+                connection_name = futures[future]
+                try:
+                    completed[connection_name] = future.result()
+                except Exception as e:
+                    errors[connection_name] = str(e)
+        
+        # Populate in the caller's order rather than completion order
+        for connection_name in queries:
+            if connection_name in completed:
+                results[connection_name] = completed[connection_name]
         
         if errors:
             self.logger.warning(f"Some federated queries failed: {errors}")
@@ -210,8 +301,14 @@ class DatabaseManager:
                 # Get columns
                 columns = inspector.get_columns(table_name)
                 
-                # Get primary keys
-                primary_keys = inspector.get_pk_constraint(table_name)['constrained_columns']
+                # Get primary keys; dialects that flag them per column (SQLite
+                # reports the key position) need no separate constraint lookup
+                if columns and all('primary_key' in col for col in columns):
+                    key_columns = sorted((col for col in columns if col['primary_key']),
+                                         key=lambda col: col['primary_key'])
+                    primary_keys = [col['name'] for col in key_columns]
+                else:
+                    primary_keys = inspector.get_pk_constraint(table_name)['constrained_columns']
                 
                 # Get foreign keys
                 foreign_keys = inspector.get_foreign_keys(table_name)
@@ -241,12 +338,16 @@ class DatabaseManager:
         try:
             with self.get_connection(connection_name) as conn:
                 # Use EXPLAIN to validate query syntax
-                if self.db_types[connection_name] == "sqlite":
-                    validate_query = f"EXPLAIN QUERY PLAN {query}"
-                else:
-                    validate_query = f"EXPLAIN {query}"
+                cache_key = (connection_name, query)
+                statement = self._validate_cache.get(cache_key)
+                if statement is None:
+                    statement = text(self._explain_prefix[connection_name] + query)
+                    if len(self._validate_cache) >= self.validate_cache_size:
+                        # Evict the oldest entry (dicts keep insertion order)
+                        self._validate_cache.pop(next(iter(self._validate_cache)))
+                    self._validate_cache[cache_key] = statement
                 
-                conn.execute(text(validate_query))
+                conn.execute(statement)
                 return True, ""
                 
         except Exception as e:
@@ -292,6 +393,9 @@ class DatabaseManager:
                 del self.engines[name]
                 del self.session_makers[name]
                 del self.db_types[name]
+                self._explain_prefix.pop(name, None)
+                self._schema_cache.pop(name, None)
+                self._validate_cache = {k: v for k, v in self._validate_cache.items() if k[0] != name}
                 self.logger.info(f"Removed connection: {name}")
                 return True
             return False
@@ -311,6 +415,9 @@ class DatabaseManager:
         self.engines.clear()
         self.session_makers.clear()
         self.db_types.clear()
+        self._explain_prefix.clear()
+        self._validate_cache.clear()
+        self._schema_cache.clear()
 
 # Global database manager instance
 db_manager = DatabaseManager()
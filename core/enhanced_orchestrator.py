@@ -1,26 +1,48 @@
+import re
+import logging
+import importlib
 import sqlite3
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple, List, NamedTuple
 
-# Enhanced agents with graceful fallback
-try:
-    from agents.enhanced_nlu_agent import EnhancedNLUAgent
-    from agents.sql_planner_agent import SQLPlannerAgent
-    from agents.enhanced_execution_agent import EnhancedExecutionAgent
-    from agents.enhanced_reflex_agent import EnhancedReflexAgent
-    from agents.enhanced_explanation_agent import EnhancedExplanationAgent
-except ImportError as e:
-    print(f"⚠️ Warning: Enhanced agents not available ({e}), using basic agents")
-    from agents.nlu_agent import NLUAgent
-    from agents.execution_agent import ExecutionAgent
-    from agents.reflex_agent import ReflexAgent
-    from agents.explanation_agent import ExplanationAgent
-    # Fallback to basic agents
-    EnhancedNLUAgent = NLUAgent
-    EnhancedExecutionAgent = ExecutionAgent
-    EnhancedReflexAgent = ReflexAgent
-    EnhancedExplanationAgent = ExplanationAgent
+from agents.sql_planner_agent import SQLPlannerAgent, WHERE_PARAM
+
+logger = logging.getLogger(__name__)
+
+# Enhanced agents are imported on first use (the NLU pulls in torch/transformers),
+# with graceful fallback to the basic agents: name -> (enhanced, basic)
+_AGENT_CLASSES = {
+    "nlu": (("agents.enhanced_nlu_agent", "EnhancedNLUAgent"), ("agents.nlu_agent", "NLUAgent")),
+    "executor": (("agents.enhanced_execution_agent", "EnhancedExecutionAgent"), ("agents.execution_agent", "ExecutionAgent")),
+    "reflex": (("agents.enhanced_reflex_agent", "EnhancedReflexAgent"), ("agents.reflex_agent", "ReflexAgent")),
+    "explanation": (("agents.enhanced_explanation_agent", "EnhancedExplanationAgent"), ("agents.explanation_agent", "ExplanationAgent")),
+}
+
+def _load_agent_class(name: str):
+    """Import the enhanced agent class for name, falling back to the basic one"""
+    (module_name, class_name), (basic_module, basic_class) = _AGENT_CLASSES[name]
+    try:
+        return getattr(importlib.import_module(module_name), class_name)
+    except ImportError as e:
+        print(f"⚠️ Warning: Enhanced agents not available ({e}), using basic agents")
+        return getattr(importlib.import_module(basic_module), basic_class)
+
+def _lazy_agent(name: str) -> property:
+    """Property that instantiates the named agent on first access"""
+    def get(self):
+        agent = self._agents.get(name)
+        if agent is None:
+            agent = _load_agent_class(name)()
+            self._agents[name] = agent
+        return agent
+    
+    def set(self, agent):
+        self._agents[name] = agent
+    
+    return property(get, set, doc=f"Lazily created {name} agent")
 
 # Enhanced core components
 from core.database_manager import db_manager, initialize_default_connections
@@ -28,24 +50,96 @@ from core.performance_optimizer import performance_optimizer
 from core.security_manager import security_manager, Permission
 from core.sql_safety import validate_sql, SQLSafetyError
 
+# Placeholder for the WHERE value in parameterized planner SQL
+_WHERE_PLACEHOLDER = f":{WHERE_PARAM}"
+
+# Numeric literals in a question; questions that differ only in their single
+# number (the WHERE value) share one query template
+_QUESTION_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+# Trivial single-table questions planned without NLU: (pattern, aggregation, SQL template)
+_FAST_PATTERNS = [
+    (re.compile(r"^(?:how many|count)\s+(\w+)\s*\??$", re.IGNORECASE), "COUNT", "SELECT COUNT(*) FROM {t}"),
+    (re.compile(r"^(?:show|list)(?:\s+all)?\s+(\w+)\s*$", re.IGNORECASE), None, "SELECT * FROM {t}"),
+]
+
+class QueryResult(NamedTuple):
+    """Result of one handled query (tuple-backed, no per-instance dict)"""
+    sql: Optional[str] = None
+    result: Any = None
+    explanation: str = ""
+    confidence: float = 0.0
+    error: Optional[str] = None
+    execution_time: Optional[float] = None
+    database: Optional[str] = None
+    performance_metrics: Optional[Dict[str, Any]] = None
+    ai_enhancements: Optional[Dict[str, Any]] = None
+    security_info: Optional[Dict[str, Any]] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-style dict; optional fields are included only when set"""
+        data = {
+            "sql": self.sql,
+            "result": self.result,
+            "explanation": self.explanation,
+            "confidence": self.confidence
+        }
+        for name in self._fields[4:]:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
+
 class EnhancedOrchestrator:
     """Enhanced NeuroSQL orchestrator with AI, multi-DB, performance, and security"""
     
+    nlu = _lazy_agent("nlu")
+    executor = _lazy_agent("executor")
+    reflex = _lazy_agent("reflex")
+    explanation = _lazy_agent("explanation")
+    
+    # Special commands by first word: (matches normalized input?, handler)
+    _COMMANDS = {
+        "show": (lambda norm: norm == "show tables",
+                 lambda self, user_input, database, user_id: self._handle_show_tables(database, user_id)),
+        "describe": (lambda norm: norm.startswith("describe "),
+                     lambda self, user_input, database, user_id: self._handle_describe_table(user_input, database, user_id)),
+        "import": (lambda norm: norm.startswith("import "),
+                   lambda self, user_input, database, user_id: self._handle_import_csv(user_input, database, user_id)),
+        "load": (lambda norm: norm.startswith("load "),
+                 lambda self, user_input, database, user_id: self._handle_load_database(user_input, user_id)),
+        "performance": (lambda norm: norm == "performance report",
+                        lambda self, user_input, database, user_id: self._handle_performance_report(user_id)),
+        "optimization": (lambda norm: norm == "optimization suggestions",
+                         lambda self, user_input, database, user_id: self._handle_optimization_suggestions(user_id)),
+    }
+    
     def __init__(self, default_database: str = "database.db"):
         # Initialize database manager
         initialize_default_connections()
         
-        # Initialize enhanced agents
-        self.nlu = EnhancedNLUAgent()
+        # Initialize agents (NLU, executor, reflex and explanation on first use)
+        self._agents: Dict[str, Any] = {}
         self.planner = SQLPlannerAgent()
-        self.executor = EnhancedExecutionAgent()
-        self.reflex = EnhancedReflexAgent()
-        self.explanation = EnhancedExplanationAgent()
         
         # Set default database
         self.current_db = "default"
         self.default_database = default_database
         
+        # Overlaps transformer inference with schema loading in the pipeline
+        self._pipeline_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pipeline")
+        
+        # (database, question) -> (schema, sql, intent, (optimized sql, optimizations) once validated),
+        # least recently used first
+        self._plan_cache: "OrderedDict[Tuple[str, str], Tuple[Dict, str, Dict, Optional[Tuple[str, List[str]]]]]" = OrderedDict()
+        self.plan_cache_size = 512
+        
+        # (database, question with its number as "?") -> (schema, SQL with :where_value, intent, number)
+        self._template_cache: "OrderedDict[Tuple[str, str], Tuple[Dict, str, Dict, str]]" = OrderedDict()
+        
+        # database -> (PRAGMA schema_version, (schema, relations)) for SQLite connections
+        self._schema_cache: Dict[str, Tuple[int, Tuple[Dict[str, List[str]], List[Dict]]]] = {}
+        
         print("🚀 Enhanced NeuroSQL Orchestrator Initialized")
         print("✅ AI/ML Integration: Enabled")
         print("✅ Multi-Database Support: Enabled")
@@ -64,135 +158,251 @@ class EnhancedOrchestrator:
         Returns:
             Enhanced result with performance metrics and security info
         """
-        start_time = time.time()
+        return self._handle_query(user_input, user_id, database).to_dict()
+    
+    def run_query(self, user_input: str, user_id: Optional[str] = None, database: Optional[str] = None) -> QueryResult:
+        """handle_query returning the QueryResult itself, for callers that read its fields directly"""
+        return self._handle_query(user_input, user_id, database)
+    
+    def handle_queries(self, inputs: List[str], user_id: Optional[str] = None, database: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Handle several queries, scoring all questions in one batched transformer pass
+        
+        Returns:
+            One result per input, in input order
+        """
+        scores: Dict[int, float] = {}
+        if getattr(self.nlu, "use_transformers", False):
+            questions = [(i, text) for i, text in enumerate(inputs) if not self._match_command(text)]
+            batch = self.nlu.semantic_scores([text for _, text in questions])
+            scores = {i: score for (i, _), score in zip(questions, batch)}
+        
+        return [
+            self._handle_query(text, user_id, database, semantic_score=scores.get(i)).to_dict()
+            for i, text in enumerate(inputs)
+        ]
+    
+    def _match_command(self, user_input: str):
+        """Return the special-command handler for user_input, if any"""
+        norm = user_input.strip().lower()
+        command = self._COMMANDS.get(norm.split(None, 1)[0] if norm else "")
+        if command and command[0](norm):
+            return command[1]
+        return None
+    
+    def _handle_query(self, user_input: str, user_id: Optional[str], database: Optional[str],
+                      semantic_score: Optional[float] = None) -> QueryResult:
+        """Shared implementation of handle_query and handle_queries"""
+        start_ns = time.perf_counter_ns()
         
         # Use provided database or default
         target_db = database or self.current_db
         
         try:
-            # Security check
+            # Security check (the resolved user is reused by the pipeline)
+            user = None
             if user_id:
                 user = security_manager.get_user(user_id)
                 if not user:
-                    return {
-                        "sql": None,
-                        "result": None,
-                        "explanation": "User not found or not authenticated",
-                        "confidence": 0.0,
-                        "error": "authentication_failed",
-                        "execution_time": time.time() - start_time
-                    }
+                    return QueryResult(
+                        sql=None,
+                        result=None,
+                        explanation="User not found or not authenticated",
+                        confidence=0.0,
+                        error="authentication_failed",
+                        execution_time=(time.perf_counter_ns() - start_ns) / 1e9
+                    )
             
-            # Handle special commands
-            if user_input.strip().lower() == "show tables":
-                return self._handle_show_tables(target_db, user_id)
-            elif user_input.strip().lower().startswith("describe "):
-                return self._handle_describe_table(user_input, target_db, user_id)
-            elif user_input.strip().lower().startswith("import "):
-                return self._handle_import_csv(user_input, target_db, user_id)
-            elif user_input.strip().lower().startswith("load "):
-                return self._handle_load_database(user_input, user_id)
-            elif user_input.strip().lower() == "performance report":
-                return self._handle_performance_report(user_id)
-            elif user_input.strip().lower() == "optimization suggestions":
-                return self._handle_optimization_suggestions(user_id)
+            # Handle special commands (one lookup on the first word)
+            handler = self._match_command(user_input)
+            if handler:
+                return handler(self, user_input, target_db, user_id)
             
             # Main query processing pipeline
-            return self._process_query_pipeline(user_input, target_db, user_id, start_time)
+            return self._process_query_pipeline(user_input, target_db, user_id, start_ns, semantic_score, user)
             
         except Exception as e:
-            execution_time = time.time() - start_time
+            execution_time = (time.perf_counter_ns() - start_ns) / 1e9
             print(f"❌ System Error: {e}")
             
-            return {
-                "sql": None,
-                "result": None,
-                "explanation": f"System error: {e}",
-                "confidence": 0.0,
-                "error": "system_error",
-                "execution_time": execution_time
-            }
+            return QueryResult(
+                sql=None,
+                result=None,
+                explanation=f"System error: {e}",
+                confidence=0.0,
+                error="system_error",
+                execution_time=execution_time
+            )
     
-    def _process_query_pipeline(self, user_input: str, database: str, user_id: Optional[str], start_time: float) -> Dict[str, Any]:
+    def _process_query_pipeline(self, user_input: str, database: str, user_id: Optional[str], start_ns: int,
+                                semantic_score: Optional[float] = None, user=None) -> QueryResult:
         """Main query processing pipeline with all enhancements"""
         
-        # Step 1: Get database schema
-        print(f"\n[1] Reading database schema from {database}...")
-        schema, relations = db_manager.get_schema(database)
-        print(f"[Schema]: {len(schema)} tables found")
-        
-        # Step 2: Enhanced NLU processing
-        print("[2] AI-powered question understanding...")
-        intent = self.nlu.parse(user_input, schema)
-        print(f"[Intent]: {intent}")
+        # Objects used several times per query, bound once (agents stay lazy)
+        plan_cache = self._plan_cache
+        template_cache = self._template_cache
+        optimizer = performance_optimizer
+        
+        # Same question against the same schema object plans to the same SQL
+        # (case is kept in the key because WHERE values keep their casing)
+        plan_key = (database, user_input.strip())
+        cached_plan = plan_cache.get(plan_key)
+        
+        # Questions differing only in their number reuse a planned template
+        template_key, number = None, None
+        if cached_plan is None:
+            numbers = _QUESTION_NUMBER_RE.findall(plan_key[1])
+            if len(numbers) == 1:
+                number = numbers[0]
+                template_key = (database, _QUESTION_NUMBER_RE.sub("?", plan_key[1]))
+        cached_template = template_cache.get(template_key) if template_key else None
+        
+        # Trivial questions ("how many students") skip NLU and planning
+        fast_match = None
+        if cached_plan is None and cached_template is None:
+            for pattern, aggregation, template in _FAST_PATTERNS:
+                match = pattern.match(plan_key[1])
+                if match:
+                    fast_match = (match.group(1), aggregation, template)
+                    break
+        
+        # Transformer scoring does not need the schema, so start it first
+        # (unless handle_queries already scored this question in a batch)
+        score_future = None
+        if cached_plan is None and cached_template is None and fast_match is None and semantic_score is None and getattr(self.nlu, "use_transformers", False):
+            score_future = self._pipeline_executor.submit(self.nlu.semantic_score, user_input)
         
-        # Step 3: SQL planning
-        print("[3] Planning SQL query...")
-        sql = self.planner.generate_sql(intent, schema, relations, None)
-        
-        if sql is None:
-            raise SQLSafetyError("Planner failed to produce valid SQL")
+        # Step 1: Get database schema
+        logger.debug("[1] Reading database schema from %s...", database)
+        schema, relations = self._get_schema(database)
+        logger.debug("[Schema]: %d tables found", len(schema))
+        
+        fast_plan = self._fast_path_plan(fast_match, schema) if fast_match else None
+        
+        # Template SQL was already safety-validated; only the number differs.
+        # A cached plan may also carry its validated, optimized SQL (steps 5-6).
+        validated = False
+        prepared = None
+        new_plan = False
+        if cached_plan is not None and cached_plan[0] is schema:
+            plan_cache.move_to_end(plan_key)
+            _, sql, intent, prepared = cached_plan
+            logger.debug("[2-3] Reusing cached plan...")
+        elif cached_template is not None and cached_template[0] is schema:
+            template_cache.move_to_end(template_key)
+            _, template_sql, intent, old_number = cached_template
+            sql = template_sql.replace(_WHERE_PLACEHOLDER, number)
+            intent = self._rebind_intent(intent, old_number, number)
+            validated = True
+            logger.debug("[2-3] Reusing query template: %s", sql)
+        elif fast_plan is not None:
+            sql, intent = fast_plan
+            logger.debug("[2-3] Fast path: %s", sql)
+        else:
+            # Step 2: Enhanced NLU processing
+            logger.debug("[2] AI-powered question understanding...")
+            if semantic_score is not None:
+                intent = self.nlu.parse(user_input, schema, semantic_score=semantic_score)
+            elif score_future is not None:
+                intent = self.nlu.parse(user_input, schema, semantic_score=score_future.result())
+            else:
+                intent = self.nlu.parse(user_input, schema)
+            logger.debug("[Intent]: %s", intent)
+            
+            # Step 3: SQL planning
+            logger.debug("[3] Planning SQL query...")
+            template_sql, params = self.planner.generate_parameterized_sql(intent, schema, relations, None)
+            
+            if template_sql is None:
+                raise SQLSafetyError("Planner failed to produce valid SQL")
+            
+            where_value = intent.get("where_value")
+            sql = template_sql.replace(_WHERE_PLACEHOLDER, str(where_value)) if params else template_sql
+            
+            self._remember(plan_cache, plan_key, (schema, sql, intent, None))
+            new_plan = True
+            if template_key and params and where_value == number:
+                validate_sql(sql, {"tables": schema})
+                validated = True
+                self._remember(template_cache, template_key, (schema, template_sql, intent, number))
         
         # Step 4: Security validation
-        print("[4] Security validation...")
+        logger.debug("[4] Security validation...")
         if user_id:
-            has_permission, security_message = security_manager.check_query_permission(user_id, sql, database)
+            has_permission, security_message = security_manager.check_query_permission(user_id, sql, database, user=user)
             if not has_permission:
-                return {
-                    "sql": sql,
-                    "result": None,
-                    "explanation": f"Query blocked by security policy: {security_message}",
-                    "confidence": 0.0,
-                    "error": "security_blocked",
-                    "execution_time": time.time() - start_time
-                }
-        
-        # Step 5: SQL safety validation
-        print("[5] SQL safety validation...")
-        validate_sql(sql, {"tables": schema})
-        
-        # Step 6: Performance optimization
-        print("[6] Performance optimization...")
-        optimized_sql, optimizations = performance_optimizer.optimize_query_execution(sql, database)
-        if optimizations:
-            print(f"[Optimizations]: {optimizations}")
+                return QueryResult(
+                    sql=sql,
+                    result=None,
+                    explanation=f"Query blocked by security policy: {security_message}",
+                    confidence=0.0,
+                    error="security_blocked",
+                    execution_time=(time.perf_counter_ns() - start_ns) / 1e9
+                )
+        
+        if prepared is not None:
+            optimized_sql, optimizations = prepared
+            logger.debug("[5-6] Reusing validated, optimized SQL...")
+        else:
+            # Step 5: SQL safety validation
+            logger.debug("[5] SQL safety validation...")
+            if not validated:
+                validate_sql(sql, {"tables": schema})
+            
+            # Step 6: Performance optimization
+            logger.debug("[6] Performance optimization...")
+            optimized_sql, optimizations = optimizer.optimize_query_execution(sql, database)
+            if optimizations:
+                logger.debug("[Optimizations]: %s", optimizations)
+            
+            # Both steps depend only on the SQL and schema, so repeats of this question skip them
+            if new_plan and plan_key in plan_cache:
+                plan_cache[plan_key] = (schema, sql, intent, (optimized_sql, optimizations))
         
         # Step 7: Query execution with performance monitoring
-        print("[7] Executing optimized query...")
-        execution_start = time.time()
+        logger.debug("[7] Executing optimized query...")
+        execution_start = time.perf_counter_ns()
         result = db_manager.execute_query(database, optimized_sql)
+        execution_time = (time.perf_counter_ns() - execution_start) / 1e9
         
-        # Step 8: Performance analysis
-        print("[8] Performance analysis...")
-        metrics = performance_optimizer.analyze_query_performance(optimized_sql, database)
+        # Step 8: Performance analysis (runs alongside step 9; both only read the result)
+        logger.debug("[8] Performance analysis...")
+        metrics_future = self._pipeline_executor.submit(
+            optimizer.analyze_query_performance, optimized_sql, database
+        )
         
-        # Step 9: Enhanced explanation generation
-        print("[9] Generating enhanced explanation...")
+        # Step 9: Enhanced explanation generation (the score is filled in once metrics arrive)
+        logger.debug("[9] Generating enhanced explanation...")
         explanation_data = self.explanation.generate_explanation(
             optimized_sql, intent, result, {
                 "execution_time": execution_time,
-                "performance_score": metrics.get("performance_score", 0) if metrics else 0,
+                "performance_score": 0,
                 "optimizations_applied": optimizations,
-                "cache_hit": performance_optimizer.cache_enabled and execution_time < 0.1
+                "cache_hit": optimizer.cache_enabled and execution_time < 0.1
             }
         )
         
-        # Combine all explanations
-        detailed_explanation = explanation_data["detailed_explanation"]
-        if not detailed_explanation:
-            detailed_explanation = explanation_data["primary_explanation"]
+        metrics = metrics_future.result()
+        performance_score = self._calculate_performance_score(metrics)
+        if "execution_summary" in explanation_data:
+            explanation_data["execution_summary"]["performance_score"] = performance_score
+        
+        # Combine all explanations (collected as parts, joined once)
+        explanation_parts = [explanation_data["detailed_explanation"] or explanation_data["primary_explanation"]]
         
         # Add insights to explanation
         insights = explanation_data.get("insights", [])
         if insights:
-            detailed_explanation += f" | Insights: {'; '.join(insights[:2])}"  # Limit to top 2 insights
+            explanation_parts.append(f"| Insights: {'; '.join(insights[:2])}")  # Limit to top 2 insights
         
         # Add suggestions to explanation
         suggestions = explanation_data.get("suggestions", [])
         if suggestions:
-            detailed_explanation += f" | Suggestions: {'; '.join(suggestions[:2])}"  # Limit to top 2 suggestions
+            explanation_parts.append(f"| Suggestions: {'; '.join(suggestions[:2])}")  # Limit to top 2 suggestions
+        
+        detailed_explanation = " ".join(explanation_parts)
         
-        # Step 10: Security audit logging
+        # Step 10: Security audit logging (the file write happens on the security manager's writer thread)
         if user_id:
             security_manager._log_audit(
                 user_id=user_id,
@@ -209,31 +419,99 @@ class EnhancedOrchestrator:
                 }
             )
         
-        total_execution_time = time.time() - start_time
+        total_execution_time = (time.perf_counter_ns() - start_ns) / 1e9
         
-        return {
-            "sql": optimized_sql,
-            "result": result,
-            "explanation": detailed_explanation,
-            "confidence": intent.get("confidence", 0.8),
-            "execution_time": total_execution_time,
-            "performance_metrics": {
+        return QueryResult(
+            sql=optimized_sql,
+            result=result,
+            explanation=detailed_explanation,
+            confidence=intent.get("confidence", 0.8),
+            execution_time=total_execution_time,
+            performance_metrics={
                 "query_execution_time": execution_time,
                 "rows_returned": len(result) if result else 0,
                 "optimizations_applied": optimizations,
-                "performance_score": metrics.get("performance_score", 0) if metrics else 0
+                "performance_score": performance_score
             },
-            "ai_enhancements": {
+            ai_enhancements={
                 "nlu_method": intent.get("method", "regex"),
                 "temporal_intent": intent.get("temporal", {}),
                 "comparative_intent": intent.get("comparative", {}),
                 "semantic_score": intent.get("semantic_score", 0.0)
             },
-            "security_info": {
+            security_info={
                 "user_authenticated": user_id is not None,
                 "permissions_checked": user_id is not None
             }
-        }
+        )
+    
+    def _remember(self, cache: "OrderedDict", key: Tuple[str, str], value: Tuple) -> None:
+        """Insert into an LRU plan cache, evicting the oldest entry past plan_cache_size"""
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > self.plan_cache_size:
+            cache.popitem(last=False)
+    
+    @staticmethod
+    def _rebind_intent(intent: Dict[str, Any], old_number: str, number: str) -> Dict[str, Any]:
+        """Copy of a template's intent with its WHERE value replaced by number"""
+        intent = dict(intent, where_value=number)
+        comparative = intent.get("comparative")
+        if comparative and "raw_expression" in comparative:
+            intent["comparative"] = dict(
+                comparative, raw_expression=comparative["raw_expression"].replace(old_number, number)
+            )
+        return intent
+    
+    def _fast_path_plan(self, fast_match: Tuple[str, Optional[str], str], schema: Dict[str, List[str]]) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Resolve a fast-path match to (sql, intent), or None if the word is not a table"""
+        word, aggregation, template = fast_match
+        word = word.lower()
+        
+        for table in schema:
+            table_l = table.lower()
+            # Same table matching as the NLU: exact name or simple singular
+            if word == table_l or (table_l.endswith("s") and word == table_l[:-1]):
+                intent = {
+                    "table": table,
+                    "tables": [table],
+                    "column": None,
+                    "columns": [],
+                    "aggregation": aggregation,
+                    "where_column": None,
+                    "where_operator": None,
+                    "where_value": None,
+                    "temporal": {},
+                    "comparative": {},
+                    "confidence": 1.0,
+                    "method": "fast_path"
+                }
+                return template.format(t=table), intent
+        
+        return None
+    
+    def shutdown(self):
+        """Flush pending audit events and metrics, and stop background workers"""
+        self._pipeline_executor.shutdown(wait=True)
+        performance_optimizer.shutdown()
+        security_manager.flush()
+    
+    def _get_schema(self, database: str) -> Tuple[Dict[str, List[str]], List[Dict]]:
+        """Get schema, reusing it while the SQLite schema_version is unchanged"""
+        if db_manager.db_types.get(database) != "sqlite":
+            return db_manager.get_schema(database)
+        
+        version = db_manager.execute_query_single(database, "PRAGMA schema_version")
+        cached = self._schema_cache.get(database)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        
+        # Schema changed (or first use): make sure the manager re-introspects too
+        db_manager.invalidate_schema(database)
+        schema_info = db_manager.get_schema(database)
+        if schema_info[0]:
+            self._schema_cache[database] = (version, schema_info)
+        return schema_info
     
     def _generate_enhanced_explanation(self, intent: Dict, sql: str, metrics, optimizations: List[str]) -> str:
         """Generate enhanced explanation with AI insights"""
@@ -299,130 +577,131 @@ class EnhancedOrchestrator:
         
         return max(0.0, min(100.0, score))
     
-    def _handle_show_tables(self, database: str, user_id: Optional[str]) -> Dict[str, Any]:
+    def _handle_show_tables(self, database: str, user_id: Optional[str]) -> QueryResult:
         """Handle show tables command"""
         try:
-            tables = list(db_manager.get_schema(database)[0].keys())
-            return {
-                "sql": None,
-                "result": tables,
-                "explanation": f"Listed all tables in {database} database.",
-                "confidence": 1.0,
-                "database": database
-            }
+            tables = list(self._get_schema(database)[0].keys())
+            return QueryResult(
+                sql=None,
+                result=tables,
+                explanation=f"Listed all tables in {database} database.",
+                confidence=1.0,
+                database=database
+            )
         except Exception as e:
-            return {
-                "sql": None,
-                "result": None,
-                "explanation": f"Failed to list tables: {e}",
-                "confidence": 0.0,
-                "error": "database_error"
-            }
+            return QueryResult(
+                sql=None,
+                result=None,
+                explanation=f"Failed to list tables: {e}",
+                confidence=0.0,
+                error="database_error"
+            )
     
-    def _handle_describe_table(self, user_input: str, database: str, user_id: Optional[str]) -> Dict[str, Any]:
+    def _handle_describe_table(self, user_input: str, database: str, user_id: Optional[str]) -> QueryResult:
         """Handle describe table command"""
         try:
-            table_name = user_input.strip().split()[1]
+            table_name = user_input.split(None, 2)[1]
             table_info = db_manager.get_table_info(database, table_name)
             
-            return {
-                "sql": None,
-                "result": table_info,
-                "explanation": f"Described table {table_name} in {database} database.",
-                "confidence": 1.0,
-                "database": database
-            }
+            return QueryResult(
+                sql=None,
+                result=table_info,
+                explanation=f"Described table {table_name} in {database} database.",
+                confidence=1.0,
+                database=database
+            )
         except Exception as e:
-            return {
-                "sql": None,
-                "result": None,
-                "explanation": f"Failed to describe table: {e}",
-                "confidence": 0.0,
-                "error": "database_error"
-            }
+            return QueryResult(
+                sql=None,
+                result=None,
+                explanation=f"Failed to describe table: {e}",
+                confidence=0.0,
+                error="database_error"
+            )
     
-    def _handle_import_csv(self, user_input: str, database: str, user_id: Optional[str]) -> Dict[str, Any]:
+    def _handle_import_csv(self, user_input: str, database: str, user_id: Optional[str]) -> QueryResult:
         """Handle CSV import command"""
         # This would need to be implemented based on your CSV import requirements
-        return {
-            "sql": None,
-            "result": None,
-            "explanation": "CSV import functionality needs to be implemented for multi-database support.",
-            "confidence": 0.0,
-            "error": "not_implemented"
-        }
+        return QueryResult(
+            sql=None,
+            result=None,
+            explanation="CSV import functionality needs to be implemented for multi-database support.",
+            confidence=0.0,
+            error="not_implemented"
+        )
     
-    def _handle_load_database(self, user_input: str, user_id: Optional[str]) -> Dict[str, Any]:
+    def _handle_load_database(self, user_input: str, user_id: Optional[str]) -> QueryResult:
         """Handle database switching"""
         try:
             new_db = user_input.strip()[5:].strip()
             if new_db in db_manager.list_connections():
                 self.current_db = new_db
-                return {
-                    "sql": None,
-                    "result": None,
-                    "explanation": f"Switched to database: {new_db}",
-                    "confidence": 1.0,
-                    "database": new_db
-                }
+                self._schema_cache.pop(new_db, None)
+                return QueryResult(
+                    sql=None,
+                    result=None,
+                    explanation=f"Switched to database: {new_db}",
+                    confidence=1.0,
+                    database=new_db
+                )
             else:
-                return {
-                    "sql": None,
-                    "result": None,
-                    "explanation": f"Database '{new_db}' not found. Available: {db_manager.list_connections()}",
-                    "confidence": 0.0,
-                    "error": "database_not_found"
-                }
+                return QueryResult(
+                    sql=None,
+                    result=None,
+                    explanation=f"Database '{new_db}' not found. Available: {db_manager.list_connections()}",
+                    confidence=0.0,
+                    error="database_not_found"
+                )
         except Exception as e:
-            return {
-                "sql": None,
-                "result": None,
-                "explanation": f"Failed to switch database: {e}",
-                "confidence": 0.0,
-                "error": "database_error"
-            }
+            return QueryResult(
+                sql=None,
+                result=None,
+                explanation=f"Failed to switch database: {e}",
+                confidence=0.0,
+                error="database_error"
+            )
     
-    def _handle_performance_report(self, user_id: Optional[str]) -> Dict[str, Any]:
+    def _handle_performance_report(self, user_id: Optional[str]) -> QueryResult:
         """Handle performance report command"""
         if user_id:
             user = security_manager.get_user(user_id)
-            if not user or not security_manager.check_permission(user_id, Permission.READ_DATA):
-                return {
-                    "sql": None,
-                    "result": None,
-                    "explanation": "No permission to view performance reports",
-                    "confidence": 0.0,
-                    "error": "permission_denied"
-                }
+            if not user or not security_manager._user_has_permission(user, Permission.READ_DATA):
+                return QueryResult(
+                    sql=None,
+                    result=None,
+                    explanation="No permission to view performance reports",
+                    confidence=0.0,
+                    error="permission_denied"
+                )
         
         report = performance_optimizer.get_performance_report()
-        return {
-            "sql": None,
-            "result": report,
-            "explanation": "Generated performance report for the last 24 hours.",
-            "confidence": 1.0
-        }
+        return QueryResult(
+            sql=None,
+            result=report,
+            explanation="Generated performance report for the last 24 hours.",
+            confidence=1.0
+        )
     
-    def _handle_optimization_suggestions(self, user_id: Optional[str]) -> Dict[str, Any]:
+    def _handle_optimization_suggestions(self, user_id: Optional[str]) -> QueryResult:
         """Handle optimization suggestions command"""
         if user_id:
             user = security_manager.get_user(user_id)
-            if not user or not security_manager.check_permission(user_id, Permission.READ_DATA):
-                return {
-                    "sql": None,
-                    "result": None,
-                    "explanation": "No permission to view optimization suggestions",
-                    "confidence": 0.0,
-                    "error": "permission_denied"
-                }
+            if not user or not security_manager._user_has_permission(user, Permission.READ_DATA):
+                return QueryResult(
+                    sql=None,
+                    result=None,
+                    explanation="No permission to view optimization suggestions",
+                    confidence=0.0,
+                    error="permission_denied"
+                )
         
         suggestions = performance_optimizer.get_optimization_recommendations()
-        return {
-            "sql": None,
-            "result": suggestions,
-            "explanation": "Generated optimization suggestions based on query history.",
-            "confidence": 1.0
-        }
+        return QueryResult(
+            sql=None,
+            result=suggestions,
+            explanation="Generated optimization suggestions based on query history.",
+            confidence=1.0
+        )
     
     def get_system_status(self) -> Dict[str, Any]:
         """Get comprehensive system status"""
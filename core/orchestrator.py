@@ -1,7 +1,7 @@
-import sqlite3
+from core.sqlite_pool import SQLitePool
 
 from agents.nlu_agent import NLUAgent
-from agents.sql_planner_agent import SQLPlannerAgent
+from agents.sql_planner_agent import SQLPlannerAgent, WHERE_PARAM
 from agents.execution_agent import ExecutionAgent
 
 # 🔐 SAFETY LAYER
@@ -21,24 +21,42 @@ class Orchestrator:
     # =========================
     def load_database(self, db_path):
         try:
-            if hasattr(self, "conn"):
-                self.conn.close()
-            self.conn = sqlite3.connect(db_path)
+            if hasattr(self, "pool"):
+                self.pool.close()
+            # WAL-tuned writer for imports/schema plus a pool of readers for queries
+            self.pool = SQLitePool(db_path)
+            self.conn = self.pool.writer
             self.current_db = db_path
+            self._schema_cache = None
             print(f"✅ Loaded database: {db_path}")
         except Exception as e:
             print(f"❌ Failed to load database: {e}")
             raise
 
+    # =========================
+    # SCHEMA (cached until PRAGMA schema_version changes)
+    # =========================
+    def get_schema(self):
+        version = self.conn.execute("PRAGMA schema_version").fetchone()[0]
+
+        if self._schema_cache is None or self._schema_cache[0] != version:
+            schema, relations = self.executor.read_schema(self.conn)
+            self._schema_cache = (version, schema, relations)
+
+        return self._schema_cache[1], self._schema_cache[2]
+
     # =========================
     # MAIN ENTRY POINT
     # =========================
     def handle_query(self, user_input):
 
+        cmd = user_input.strip()
+        lcmd = cmd.lower()
+
         # =========================
         # SHOW TABLES
         # =========================
-        if user_input.strip().lower() == "show tables":
+        if lcmd == "show tables":
             tables = self.executor.show_tables(self.conn)
             return {
                 "sql": None,
@@ -50,8 +68,8 @@ class Orchestrator:
         # =========================
         # DESCRIBE TABLE
         # =========================
-        if user_input.strip().lower().startswith("describe "):
-            table_name = user_input.strip().split()[1]
+        if lcmd.startswith("describe "):
+            table_name = cmd.split(None, 2)[1]
             schema = self.executor.describe_table(self.conn, table_name)
             return {
                 "sql": None,
@@ -63,12 +81,13 @@ class Orchestrator:
         # =========================
         # IMPORT CSV
         # =========================
-        if user_input.strip().lower().startswith("import "):
-            parts = user_input.strip().split()
+        if lcmd.startswith("import "):
+            parts = cmd.split()
             csv_path = parts[1]
             table_name = parts[3]
 
             self.executor.import_csv(self.conn, csv_path, table_name)
+            self._schema_cache = None
             return {
                 "sql": None,
                 "result": None,
@@ -79,8 +98,8 @@ class Orchestrator:
         # =========================
         # LOAD DATABASE
         # =========================
-        if user_input.strip().lower().startswith("load "):
-            new_db = user_input.strip()[5:].strip()
+        if lcmd.startswith("load "):
+            new_db = cmd[5:].strip()
             self.load_database(new_db)
             return {
                 "sql": None,
@@ -93,7 +112,7 @@ class Orchestrator:
         # NORMAL PIPELINE
         # =========================
         try:
-            schema, relations = self.executor.read_schema(self.conn)
+            schema, relations = self.get_schema()
 
             print("\n[1] Understanding question...")
             intent = self.nlu.parse(user_input, schema)
@@ -103,7 +122,8 @@ class Orchestrator:
             print("[Intent Detected]:", intent)
 
             print("[3] Planning SQL...")
-            sql = self.planner.generate_sql(intent, schema, relations, self.conn)
+            with self.pool.reader() as reader:
+                sql, params = self.planner.generate_parameterized_sql(intent, schema, relations, reader)
 
             # 🚨 HARD BLOCK: Planner failure
             if sql is None or "None" in str(sql):
@@ -120,10 +140,16 @@ class Orchestrator:
             validate_sql(sql, {"tables": schema})
 
             print("[4] Executing SQL...")
-            result = self.executor.execute(sql, self.conn)
+            with self.pool.reader() as reader:
+                result = self.executor.execute(sql, reader, params)
+
+            # Report the SQL with its literal value inlined
+            if params:
+                sql = sql.replace(f":{WHERE_PARAM}", str(intent["where_value"]))
 
             return {
                 "sql": sql,
+                "params": params,
                 "result": result,
                 "explanation": "Query executed successfully.",
                 "confidence": 1.0
@@ -1,26 +1,192 @@
 import re
 import time
+import bisect
+import hashlib
+import heapq
+import itertools
+import queue
+import threading
+from collections import Counter, OrderedDict, deque
+from functools import lru_cache
+from operator import attrgetter
 import psutil
 import redis
 from typing import Dict, List, Tuple, Any, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 import logging
 import json
 from sqlalchemy import text
 from core.database_manager import db_manager
 
+# Optional fast JSON serialization with graceful fallback to stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Precompiled query-analysis patterns
+_RE_WHERE = re.compile(r'WHERE\s+(.+?)(?:\s+ORDER\s+BY|\s+GROUP\s+BY|\s+LIMIT|$)', re.IGNORECASE)
+# String literals are matched (with an empty column group) so words inside them are skipped
+_RE_WHERE_COLUMN = re.compile(r"'(?:[^']|'')*'|(\w+)\s*(?:=|>|<|LIKE|IN)", re.IGNORECASE)
+_RE_JOIN_ON = re.compile(r'JOIN\s+\w+\s+ON\s+(\w+\.\w+)\s*=\s*(\w+\.\w+)', re.IGNORECASE)
+_RE_TIME_FUNCS = re.compile(r'NOW\(\)|CURRENT_TIMESTAMP|GETDATE\(\)', re.IGNORECASE)
+_RE_SELECT_PREFIX = re.compile(r'^\s*SELECT\s+', re.IGNORECASE)
+_RE_JOIN = re.compile(r'JOIN', re.IGNORECASE)
+
+# Words _RE_WHERE_COLUMN can pick up that are never columns
+_SQL_KEYWORDS = frozenset({
+    'and', 'or', 'not', 'where', 'select', 'from', 'in', 'like', 'between', 'is',
+    'null', 'case', 'when', 'then', 'else', 'end', 'exists', 'as', 'on', 'true', 'false',
+})
+
+# Minimal SQL lexer for finding clause boundaries outside strings, comments and parentheses
+_RE_SQL_LEXEME = re.compile(r"""
+    (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<open>\()
+  | (?P<close>\))
+  | (?P<semi>;)
+  | (?P<word>\w+)
+  | (?P<other>\S)
+""", re.VERBOSE | re.DOTALL)
+
+# Query features counted in a single scan (the alternatives cannot overlap,
+# so each is found exactly where its own search would find it)
+_RE_FEATURES = re.compile(
+    r'(?P<star>SELECT\s+\*)|(?P<limit>LIMIT\s+\d+)|(?P<in_subq>\bIN\s*\()|(?P<join>JOIN)|(?P<where>WHERE)',
+    re.IGNORECASE
+)
+
+# Query rewrite rules in report order: (feature, suggest when present?, message)
+_REWRITE_RULES = (
+    ("star", True, "Replace SELECT * with specific columns"),
+    ("limit", False, "Consider adding LIMIT clause"),
+)
+
+# IN / NOT IN over a subquery (value lists need no rewrite)
+_RE_IN_SELECT = re.compile(r'\b(NOT\s+)?IN\s*\(\s*SELECT\b', re.IGNORECASE)
+
+# Engines whose optimizer does not reliably turn IN (SELECT ...) into a semi-join
+_IN_SUBQUERY_REWRITE_DIALECTS = frozenset({"mysql", "mariadb"})
+
+def _scan_query(query: str) -> Dict[str, int]:
+    """Count occurrences of each _RE_FEATURES feature in one pass"""
+    counts = dict.fromkeys(_RE_FEATURES.groupindex, 0)
+    for match in _RE_FEATURES.finditer(query):
+        counts[match.lastgroup] += 1
+    return counts
+
+# Words after which an ORDER BY list continues with another operand, so a
+# following OFFSET/FETCH is an identifier rather than a clause
+_ORDER_OPERAND_WORDS = frozenset({
+    "BY", "AND", "OR", "NOT", "IS", "IN", "LIKE", "GLOB", "BETWEEN",
+    "COLLATE", "ESCAPE", "CASE", "WHEN", "THEN", "ELSE",
+})
+
+@lru_cache(maxsize=1024)
+def _limit_insertion_point(query: str) -> Optional[Tuple[int, bool]]:
+    """
+    Where a LIMIT clause belongs in a single statement: (index, before OFFSET?).
+    None if the statement already has a top-level LIMIT/FETCH or there are
+    several statements. Trailing semicolons and comments stay after the LIMIT.
+    OFFSET/FETCH only count as clauses after a top-level FROM ... ORDER BY
+    list (SQLite accepts both words as column names elsewhere).
+    Cached per query text, so repeated queries skip the lexer walk.
+    """
+    depth = 0
+    end = 0
+    offset_at = None
+    statement_ended = False
+    seen_from = False
+    in_order_by = False
+    previous = None  # previous top-level word (upper case), ")" after an operand, None after an operator
+    
+    for lexeme in _RE_SQL_LEXEME.finditer(query):
+        kind = lexeme.lastgroup
+        if kind == "comment":
+            continue
+        if kind == "semi":
+            statement_ended = True
+            continue
+        if statement_ended:
+            return None
+        
+        if kind == "open":
+            depth += 1
+        elif kind == "close":
+            depth -= 1
+            if depth == 0:
+                previous = ")"
+        elif depth == 0:
+            if kind == "word":
+                word = lexeme.group().upper()
+                if word == "LIMIT":
+                    return None
+                if word == "FROM":
+                    seen_from = True
+                elif word == "BY" and previous == "ORDER" and seen_from:
+                    in_order_by = True
+                elif (in_order_by and word in ("OFFSET", "FETCH")
+                      and previous is not None and previous not in _ORDER_OPERAND_WORDS):
+                    if word == "FETCH":
+                        return None
+                    if offset_at is None:
+                        offset_at = lexeme.start()
+                previous = word
+            else:
+                previous = ")" if kind == "string" else None
+        end = lexeme.end()
+    
+    if offset_at is not None:
+        return offset_at, True
+    return end, False
+
+# Redis keys, pre-encoded so commands don't re-encode them per call
+_METRICS_KEY = b"query_metrics"
+_COUNTS_KEY = b"query_counts"
+
+def _json_dumps(data: Dict) -> bytes:
+    """Compact UTF-8 JSON (orjson when installed)"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+@lru_cache(maxsize=1024)
+def _metrics_json_prefix(query: str, database: str) -> bytes:
+    """Encoded '{"query":...,"database":...,' shared by every metric of a repeated query"""
+    return _json_dumps({'query': query, 'database': database})[:-1] + b","
+
+def query_fingerprint(query: str) -> str:
+    """Stable (process-independent) hash of a query, ignoring case and outer whitespace"""
+    return hashlib.blake2b(query.lower().strip().encode("utf-8"), digest_size=8).hexdigest()
+
 @dataclass
 class QueryMetrics:
     """Query performance metrics"""
     query: str
     execution_time: float
     rows_returned: int
-    cpu_usage: float
-    memory_usage: float
+    cpu_usage: float  # system CPU % sampled at query end
+    memory_usage: float  # system memory % sampled at query end
     timestamp: datetime
     database: str
     optimization_suggestions: List[str]
+    query_hash: str = ""
+    suggestions_by_type: Dict[str, List["OptimizationSuggestion"]] = field(default_factory=dict)
+    
+    def __post_init__(self):
+        if not self.query_hash:
+            self.query_hash = query_fingerprint(self.query)
+        if self.optimization_suggestions and not self.suggestions_by_type:
+            self.set_suggestions(self.optimization_suggestions)
+    
+    def set_suggestions(self, suggestions: List["OptimizationSuggestion"]):
+        """Set optimization_suggestions and their per-type buckets"""
+        self.optimization_suggestions = suggestions
+        self.suggestions_by_type = {}
+        for suggestion in suggestions:
+            self.suggestions_by_type.setdefault(suggestion.type, []).append(suggestion)
 
 @dataclass
 class OptimizationSuggestion:
@@ -36,47 +202,93 @@ class PerformanceOptimizer:
     
     def __init__(self, redis_url: str = "redis://localhost:6379"):
         self.redis_client = None
+        
+        # After redis_failure_limit consecutive errors the cache is switched
+        # off for redis_cooldown seconds instead of paying a timeout per query
+        self.redis_failure_limit = 3
+        self.redis_cooldown = 30.0
+        self._redis_failures = 0
+        self._redis_retry_at = 0.0
         try:
-            self.redis_client = redis.from_url(redis_url)
+            # Short timeouts so a dead Redis costs milliseconds, not the OS TCP timeout
+            self.redis_client = redis.from_url(redis_url, socket_timeout=0.1,
+                                               socket_connect_timeout=0.2,
+                                               health_check_interval=30)
             self.redis_client.ping()
             self.cache_enabled = True
             logging.info("Redis cache connected successfully")
-        except:
+        except (redis.RedisError, OSError):
             self.cache_enabled = False
             logging.warning("Redis not available, caching disabled")
         
-        self.query_history = []
-        self.optimization_cache = {}
+        # Metrics in arrival (chronological) order, with their timestamps kept
+        # in a parallel deque so reports can bisect to the cutoff
+        self.history_size = 1000
+        self.query_history: deque = deque(maxlen=self.history_size)
+        self._history_timestamps: deque = deque(maxlen=self.history_size)
+        
+        # (query, database) -> [feature counts, index suggestions, rewrite text or None],
+        # the parts of the suggestions that depend only on the query text; LRU order
+        self.optimization_cache: "OrderedDict[Tuple[str, str], List]" = OrderedDict()
+        self.optimization_cache_size = 2048
+        
+        # Live suggestion tallies over the last recommendation_window metrics,
+        # updated as metrics enter and leave the window
+        self.recommendation_window = 100
+        self._index_counts: Counter = Counter()  # index SQL -> occurrences
+        self._index_details: Dict[str, Tuple[str, str]] = {}  # index SQL -> (description, impact)
+        self._rewrite_counts: Counter = Counter()  # slow query -> occurrences
+        self._rewrite_details: Dict[str, List] = {}  # slow query -> [suggestion, total execution time]
+        self._stats_lock = threading.Lock()
         self.logger = logging.getLogger(__name__)
+        
+        # CPU/memory are sampled by a background thread (started on first
+        # analysis) instead of with psutil calls on every query
+        self.resource_sample_interval = 1.0
+        self._last_cpu = 0.0
+        self._last_memory = 0.0
+        self._sampler: Optional[threading.Thread] = None
+        self._sampler_lock = threading.Lock()
+        
+        # Metrics bound for Redis are queued and written in pipelined batches
+        # by a background thread (started on first use); when the queue is
+        # full new metrics are dropped rather than blocking the query. The
+        # queue also carries flush() events and the shutdown() sentinel (None).
+        self.metrics_batch_size = 100
+        self._metrics_queue: "queue.Queue[Any]" = queue.Queue(maxsize=10000)
+        self._metrics_writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        
+        # Set by shutdown() to stop both background threads
+        self._stopped = threading.Event()
     
     def analyze_query_performance(self, query: str, database: str = "default") -> QueryMetrics:
         """Analyze query performance and collect metrics"""
         start_time = time.time()
-        start_cpu = psutil.cpu_percent()
-        start_memory = psutil.virtual_memory().percent
         
         try:
-            # Execute query and measure performance
-            result = db_manager.execute_query(database, query)
+            # Execute query and measure performance (rows are only counted,
+            # so the result set is streamed instead of materialized)
+            rows_returned = db_manager.count_query_rows(database, query)
             execution_time = time.time() - start_time
             
-            # Calculate resource usage
-            end_cpu = psutil.cpu_percent()
-            end_memory = psutil.virtual_memory().percent
+            # Resource usage at query end (the sampler refreshes about once a
+            # second, so a start/end difference would nearly always be zero)
+            cpu_usage, memory_usage = self._resource_usage()
             
             metrics = QueryMetrics(
                 query=query,
                 execution_time=execution_time,
-                rows_returned=len(result) if result else 0,
-                cpu_usage=end_cpu - start_cpu,
-                memory_usage=end_memory - start_memory,
+                rows_returned=rows_returned,
+                cpu_usage=cpu_usage,
+                memory_usage=memory_usage,
                 timestamp=datetime.now(),
                 database=database,
                 optimization_suggestions=[]
             )
             
             # Generate optimization suggestions
-            metrics.optimization_suggestions = self._generate_optimization_suggestions(query, metrics, database)
+            metrics.set_suggestions(self._generate_optimization_suggestions(query, metrics, database))
             
             # Store metrics
             self._store_metrics(metrics)
@@ -87,17 +299,63 @@ class PerformanceOptimizer:
             self.logger.error(f"Query analysis failed: {e}")
             raise e
     
+    def _static_suggestions(self, query: str, database: str) -> List:
+        """Cached query-text analysis: [feature counts, index suggestions, rewrite text or None]"""
+        key = (query, database)
+        with self._stats_lock:
+            static = self.optimization_cache.get(key)
+            if static is not None:
+                self.optimization_cache.move_to_end(key)
+                return static
+        
+        features = _scan_query(query)
+        static = [features, self._suggest_indexes(query, database, features), None]
+        
+        with self._stats_lock:
+            self.optimization_cache[key] = static
+            if len(self.optimization_cache) > self.optimization_cache_size:
+                self.optimization_cache.popitem(last=False)
+        return static
+    
+    def _resource_usage(self) -> Tuple[float, float]:
+        """Latest sampled (CPU %, memory %), starting the sampler on first use"""
+        if self._sampler is None:
+            with self._sampler_lock:
+                if self._sampler is None:
+                    self._sample_resources()
+                    self._sampler = threading.Thread(
+                        target=self._sample_loop, name="resource-sampler", daemon=True
+                    )
+                    self._sampler.start()
+        return self._last_cpu, self._last_memory
+    
+    def _sample_resources(self):
+        """Take one CPU/memory sample (CPU is measured since the previous sample)"""
+        try:
+            self._last_cpu = psutil.cpu_percent(interval=None)
+            self._last_memory = psutil.virtual_memory().percent
+        except Exception as e:
+            self.logger.error(f"Resource sampling failed: {e}")
+    
+    def _sample_loop(self):
+        """Refresh the resource sample every resource_sample_interval seconds"""
+        while not self._stopped.wait(self.resource_sample_interval):
+            self._sample_resources()
+    
     def _generate_optimization_suggestions(self, query: str, metrics: QueryMetrics, database: str) -> List[OptimizationSuggestion]:
         """Generate intelligent optimization suggestions"""
         suggestions = []
+        static = self._static_suggestions(query, database)
         
         # Performance-based suggestions
         if metrics.execution_time > 1.0:  # Slow query
+            if static[2] is None:
+                static[2] = self._suggest_query_rewrite(query, static[0], database)
             suggestions.append(OptimizationSuggestion(
                 type="query_rewrite",
                 description="Query execution time is high. Consider optimization.",
                 impact="high",
-                sql_suggestion=self._suggest_query_rewrite(query)
+                sql_suggestion=static[2]
             ))
         
         # Row count based suggestions
@@ -109,8 +367,7 @@ class PerformanceOptimizer:
             ))
         
         # Index suggestions
-        index_suggestions = self._suggest_indexes(query, database)
-        suggestions.extend(index_suggestions)
+        suggestions.extend(static[1])
         
         # Caching suggestions
         if self._should_cache(query, metrics):
@@ -122,42 +379,67 @@ class PerformanceOptimizer:
         
         return suggestions
     
-    def _suggest_query_rewrite(self, query: str) -> str:
+    def _suggest_query_rewrite(self, query: str, features: Optional[Dict[str, int]] = None,
+                               database: str = "default") -> str:
         """Suggest query rewrite optimizations"""
-        suggestions = []
-        
-        # Avoid SELECT *
-        if re.search(r'SELECT\s+\*', query, re.IGNORECASE):
-            suggestions.append("Replace SELECT * with specific columns")
+        if features is None:
+            features = _scan_query(query)
         
-        # Add LIMIT for large tables
-        if not re.search(r'LIMIT\s+\d+', query, re.IGNORECASE):
-            suggestions.append("Consider adding LIMIT clause")
+        suggestions = [
+            message for feature, when_present, message in _REWRITE_RULES
+            if bool(features[feature]) == when_present
+        ]
         
-        # Suggest EXISTS instead of IN for subqueries
-        if re.search(r'\bIN\s*\(', query, re.IGNORECASE):
-            suggestions.append("Consider using EXISTS instead of IN for better performance")
+        # Subquery rewrites (only where they help on this database's engine)
+        if features["in_subq"]:
+            suggestions.extend(self._suggest_in_subquery_rewrite(query, database))
         
         # Suggest JOIN optimization
-        if query.upper().count('JOIN') > 2:
+        if features["join"] > 2:
             suggestions.append("Multiple JOINs detected. Consider breaking into smaller queries")
         
         return "; ".join(suggestions) if suggestions else "Query structure looks good"
     
-    def _suggest_indexes(self, query: str, database: str) -> List[OptimizationSuggestion]:
+    def _suggest_in_subquery_rewrite(self, query: str, database: str) -> List[str]:
+        """Dialect-aware advice for IN / NOT IN subqueries"""
+        suggestions = []
+        not_in = in_select = False
+        for match in _RE_IN_SELECT.finditer(query):
+            if match.group(1):
+                not_in = True
+            else:
+                in_select = True
+        
+        # NOT IN is not an anti-join when the subquery can return NULL, on any engine
+        if not_in:
+            suggestions.append("Rewrite NOT IN (SELECT ...) as LEFT JOIN ... WHERE <joined key> IS NULL")
+        
+        # Other planners already decorrelate IN subqueries into semi-joins
+        if in_select and db_manager.db_types.get(database) in _IN_SUBQUERY_REWRITE_DIALECTS:
+            suggestions.append("Rewrite IN (SELECT ...) as a join, e.g. SELECT DISTINCT t1.* FROM t1, t2 WHERE t1.id = t2.id")
+        
+        return suggestions
+    
+    def _suggest_indexes(self, query: str, database: str,
+                         features: Optional[Dict[str, int]] = None) -> List[OptimizationSuggestion]:
         """Suggest database indexes based on query patterns"""
         suggestions = []
+        if features is None:
+            features = _scan_query(query)
         
         try:
             # Extract WHERE conditions
-            where_match = re.search(r'WHERE\s+(.+?)(?:\s+ORDER\s+BY|\s+GROUP\s+BY|\s+LIMIT|$)', query, re.IGNORECASE)
+            where_match = _RE_WHERE.search(query) if features["where"] else None
             if where_match:
                 where_clause = where_match.group(1)
                 
-                # Extract column names from WHERE clause
-                columns = re.findall(r'(\w+)\s*(?:=|>|<|LIKE|IN)', where_clause, re.IGNORECASE)
-                
-                for column in columns:
+                # Extract column names from WHERE clause, once each
+                seen = set()
+                for column in _RE_WHERE_COLUMN.findall(where_clause):
+                    key = column.lower()
+                    if not column or key in seen or key in _SQL_KEYWORDS or column[0].isdigit():
+                        continue
+                    seen.add(key)
                     suggestions.append(OptimizationSuggestion(
                         type="index",
                         description=f"Consider adding index on column: {column}",
@@ -166,10 +448,14 @@ class PerformanceOptimizer:
                     ))
             
             # Extract JOIN conditions
-            join_matches = re.findall(r'JOIN\s+\w+\s+ON\s+(\w+\.\w+)\s*=\s*(\w+\.\w+)', query, re.IGNORECASE)
+            join_matches = _RE_JOIN_ON.findall(query) if features["join"] else []
+            seen = set()
             for join_condition in join_matches:
                 for column_ref in join_condition:
                     column = column_ref.split('.')[-1]
+                    if column.lower() in seen:
+                        continue
+                    seen.add(column.lower())
                     suggestions.append(OptimizationSuggestion(
                         type="index",
                         description=f"Consider adding index for JOIN column: {column}",
@@ -185,78 +471,205 @@ class PerformanceOptimizer:
     def _should_cache(self, query: str, metrics: QueryMetrics) -> bool:
         """Determine if query should be cached"""
         # Don't cache queries with time-sensitive functions
-        time_sensitive = re.search(r'NOW\(\)|CURRENT_TIMESTAMP|GETDATE\(\)', query, re.IGNORECASE)
+        time_sensitive = _RE_TIME_FUNCS.search(query)
         if time_sensitive:
             return False
         
         # Cache frequently executed queries
-        query_hash = hash(query.lower().strip())
+        query_hash = metrics.query_hash if metrics.query == query else query_fingerprint(query)
         cache_count = self._get_cache_count(query_hash)
         
         return cache_count > 3 or metrics.execution_time > 0.5
     
-    def _get_cache_count(self, query_hash: int) -> int:
+    def _redis_ready(self) -> bool:
+        """Whether Redis should be used now, re-enabling it once a cooldown has passed"""
+        if not self.cache_enabled and self._redis_retry_at and time.monotonic() >= self._redis_retry_at:
+            self._redis_retry_at = 0.0
+            self.cache_enabled = True
+        return self.cache_enabled
+    
+    def _redis_succeeded(self):
+        self._redis_failures = 0
+    
+    def _redis_failed(self, error: Exception):
+        """Count a Redis error, disabling the cache for a cooldown after too many in a row"""
+        self._redis_failures += 1
+        if self._redis_failures >= self.redis_failure_limit:
+            self._redis_failures = 0
+            self._redis_retry_at = time.monotonic() + self.redis_cooldown
+            self.cache_enabled = False
+            self.logger.warning(f"Redis failing ({error}), caching disabled for {self.redis_cooldown:.0f}s")
+    
+    def _get_cache_count(self, query_hash: str) -> int:
         """Get cache hit count for query"""
-        if not self.cache_enabled:
+        if not self._redis_ready():
             return 0
         
         try:
-            count = self.redis_client.get(f"query_count:{query_hash}")
-            return int(count) if count else 0
-        except:
+            count = self.redis_client.hget(_COUNTS_KEY, query_hash)
+        except (redis.RedisError, OSError) as e:
+            self._redis_failed(e)
             return 0
+        self._redis_succeeded()
+        return int(count) if count else 0
     
     def _store_metrics(self, metrics: QueryMetrics):
         """Store query metrics for analysis"""
-        self.query_history.append(metrics)
-        
-        # Keep only last 1000 metrics in memory
-        if len(self.query_history) > 1000:
-            self.query_history = self.query_history[-1000:]
-        
-        # Store in Redis if available
-        if self.cache_enabled:
+        # The bounded deques keep only the last history_size metrics in memory
+        with self._stats_lock:
+            self.query_history.append(metrics)
+            self._history_timestamps.append(metrics.timestamp)
+            
+            self._tally_suggestions(metrics, 1)
+            if len(self.query_history) > self.recommendation_window:
+                self._tally_suggestions(self.query_history[-self.recommendation_window - 1], -1)
+        
+        # Hand off to the Redis writer thread if available
+        if self._redis_ready() and not self._stopped.is_set():
+            if self._metrics_writer is None:
+                with self._writer_lock:
+                    if self._metrics_writer is None:
+                        self._metrics_writer = threading.Thread(
+                            target=self._write_loop, name="metrics-writer", daemon=True
+                        )
+                        self._metrics_writer.start()
             try:
-                metrics_dict = {
-                    'query': metrics.query,
-                    'execution_time': metrics.execution_time,
-                    'rows_returned': metrics.rows_returned,
-                    'cpu_usage': metrics.cpu_usage,
-                    'memory_usage': metrics.memory_usage,
-                    'timestamp': metrics.timestamp.isoformat(),
-                    'database': metrics.database
-                }
-                
-                self.redis_client.lpush("query_metrics", json.dumps(metrics_dict))
-                self.redis_client.ltrim("query_metrics", 0, 999)  # Keep last 1000
-                
-                # Update query count
-                query_hash = hash(metrics.query.lower().strip())
-                self.redis_client.incr(f"query_count:{query_hash}")
-                
-            except Exception as e:
-                self.logger.error(f"Failed to store metrics in Redis: {e}")
+                self._metrics_queue.put_nowait(metrics)
+            except queue.Full:
+                pass
+    
+    def _write_loop(self):
+        """Drain queued metrics into Redis, up to metrics_batch_size per round-trip, until shutdown"""
+        stopping = False
+        while not stopping:
+            items = [self._metrics_queue.get()]
+            try:
+                while len(items) < self.metrics_batch_size:
+                    items.append(self._metrics_queue.get_nowait())
+            except queue.Empty:
+                pass
+            
+            batch, waiters = [], []
+            for item in items:
+                if item is None:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+            try:
+                if batch:
+                    self._write_metrics(batch)
+            finally:
+                for waiter in waiters:
+                    waiter.set()
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until metrics queued so far have been written to Redis"""
+        writer = self._metrics_writer
+        if writer is None or not writer.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._metrics_queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+    
+    def shutdown(self, timeout: Optional[float] = None):
+        """Flush queued metrics and stop the resource sampler and metrics writer"""
+        self.flush(timeout)
+        self._stopped.set()
+        writer = self._metrics_writer
+        if writer is not None and writer.is_alive():
+            try:
+                self._metrics_queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            writer.join(timeout)
+        if self._sampler is not None:
+            self._sampler.join(timeout)
+    
+    def _write_metrics(self, batch: List[QueryMetrics]):
+        """Push a batch of metrics to Redis in one pipeline"""
+        if not self._redis_ready():
+            return
+        
+        try:
+            with self.redis_client.pipeline(transaction=False) as pipe:
+                for metrics in batch:
+                    # Only the per-run fields are encoded each time; the query
+                    # and database part is cached per distinct query
+                    metrics_json = _metrics_json_prefix(metrics.query, metrics.database) + _json_dumps({
+                        'execution_time': metrics.execution_time,
+                        'rows_returned': metrics.rows_returned,
+                        'cpu_usage': metrics.cpu_usage,
+                        'memory_usage': metrics.memory_usage,
+                        'timestamp': int(metrics.timestamp.timestamp() * 1000)  # epoch millis
+                    })[1:]
+                    pipe.lpush(_METRICS_KEY, metrics_json)
+                    
+                    # Update query count
+                    pipe.hincrby(_COUNTS_KEY, metrics.query_hash, 1)
+                pipe.ltrim(_METRICS_KEY, 0, 999)  # Keep last 1000
+                pipe.execute()
+            self._redis_succeeded()
+            
+        except (redis.RedisError, OSError) as e:
+            self.logger.error(f"Failed to store metrics in Redis: {e}")
+            self._redis_failed(e)
+    
+    def _tally_suggestions(self, metrics: QueryMetrics, delta: int):
+        """Add (delta=1) or remove (delta=-1) one metric's suggestions from the live tallies"""
+        for suggestion in metrics.suggestions_by_type.get("index", ()):
+            if suggestion.index_suggestion:
+                key = suggestion.index_suggestion
+                self._index_counts[key] += delta
+                if self._index_counts[key] <= 0:
+                    del self._index_counts[key]
+                    del self._index_details[key]
+                else:
+                    self._index_details.setdefault(key, (suggestion.description, suggestion.impact))
+        
+        if metrics.execution_time > 1.0:  # Slow queries
+            for suggestion in metrics.suggestions_by_type.get("query_rewrite", ()):
+                key = metrics.query
+                self._rewrite_counts[key] += delta
+                if self._rewrite_counts[key] <= 0:
+                    del self._rewrite_counts[key]
+                    del self._rewrite_details[key]
+                else:
+                    details = self._rewrite_details.setdefault(key, [suggestion.description, 0.0])
+                    details[1] += delta * metrics.execution_time
     
     def get_performance_report(self, hours: int = 24) -> Dict:
         """Generate performance report for specified time period"""
         cutoff_time = datetime.now() - timedelta(hours=hours)
         
-        # Filter metrics by time
-        recent_metrics = [m for m in self.query_history if m.timestamp > cutoff_time]
+        # Filter metrics by time (history is chronological, so bisect to the cutoff);
+        # the lock keeps both deques in step while queries are being recorded
+        with self._stats_lock:
+            start = bisect.bisect_right(self._history_timestamps, cutoff_time)
+            recent_metrics = list(itertools.islice(self.query_history, start, None))
         
         if not recent_metrics:
             return {"message": "No metrics available for the specified period"}
         
-        # Calculate statistics
+        # Calculate statistics in one pass
         total_queries = len(recent_metrics)
-        avg_execution_time = sum(m.execution_time for m in recent_metrics) / total_queries
-        avg_rows_returned = sum(m.rows_returned for m in recent_metrics) / total_queries
+        total_execution_time = 0.0
+        total_rows_returned = 0
+        for m in recent_metrics:
+            total_execution_time += m.execution_time
+            total_rows_returned += m.rows_returned
+        avg_execution_time = total_execution_time / total_queries
+        avg_rows_returned = total_rows_returned / total_queries
         
         # Find slowest queries
-        slowest_queries = sorted(recent_metrics, key=lambda x: x.execution_time, reverse=True)[:5]
+        slowest_queries = heapq.nlargest(5, recent_metrics, key=attrgetter("execution_time"))
         
         # Find most resource-intensive queries
-        resource_intensive = sorted(recent_metrics, key=lambda x: x.cpu_usage + x.memory_usage, reverse=True)[:5]
+        resource_intensive = heapq.nlargest(5, recent_metrics, key=lambda x: x.cpu_usage + x.memory_usage)
         
         return {
             "period_hours": hours,
@@ -287,64 +700,33 @@ class PerformanceOptimizer:
         """Get comprehensive optimization recommendations"""
         recommendations = []
         
-        # Analyze recent queries
-        recent_metrics = self.query_history[-100:] if self.query_history else []
-        
-        # Index recommendations
-        index_suggestions = {}
-        for metrics in recent_metrics:
-            for suggestion in metrics.optimization_suggestions:
-                if suggestion.type == "index" and suggestion.index_suggestion:
-                    if suggestion.index_suggestion not in index_suggestions:
-                        index_suggestions[suggestion.index_suggestion] = {
-                            "description": suggestion.description,
-                            "impact": suggestion.impact,
-                            "frequency": 0
-                        }
-                    index_suggestions[suggestion.index_suggestion]["frequency"] += 1
-        
-        # Sort by frequency and impact
-        sorted_suggestions = sorted(
-            index_suggestions.items(),
-            key=lambda x: (x[1]["frequency"], x[1]["impact"]),
-            reverse=True
-        )
-        
-        for suggestion, details in sorted_suggestions[:10]:  # Top 10 suggestions
-            recommendations.append({
-                "type": "index",
-                "sql": suggestion,
-                "description": details["description"],
-                "impact": details["impact"],
-                "frequency": details["frequency"]
-            })
-        
-        # Query rewrite recommendations
-        rewrite_suggestions = {}
-        for metrics in recent_metrics:
-            if metrics.execution_time > 1.0:  # Slow queries
-                for suggestion in metrics.optimization_suggestions:
-                    if suggestion.type == "query_rewrite":
-                        query_hash = hash(metrics.query)
-                        if query_hash not in rewrite_suggestions:
-                            rewrite_suggestions[query_hash] = {
-                                "query": metrics.query,
-                                "suggestion": suggestion.description,
-                                "avg_execution_time": metrics.execution_time,
-                                "frequency": 1
-                            }
-                        else:
-                            rewrite_suggestions[query_hash]["frequency"] += 1
-        
-        for details in rewrite_suggestions.values():
-            if details["frequency"] > 2:  # Frequently slow queries
+        with self._stats_lock:
+            # Index recommendations: top 10 by frequency and impact
+            top_indexes = heapq.nlargest(
+                10, self._index_counts.items(),
+                key=lambda x: (x[1], self._index_details[x[0]][1])
+            )
+            for suggestion, frequency in top_indexes:
+                description, impact = self._index_details[suggestion]
                 recommendations.append({
-                    "type": "query_rewrite",
-                    "query": details["query"][:100] + "..." if len(details["query"]) > 100 else details["query"],
-                    "suggestion": details["suggestion"],
-                    "avg_execution_time": round(details["avg_execution_time"], 3),
-                    "frequency": details["frequency"]
+                    "type": "index",
+                    "sql": suggestion,
+                    "description": description,
+                    "impact": impact,
+                    "frequency": frequency
                 })
+            
+            # Query rewrite recommendations
+            for query, frequency in self._rewrite_counts.items():
+                if frequency > 2:  # Frequently slow queries
+                    suggestion, total_time = self._rewrite_details[query]
+                    recommendations.append({
+                        "type": "query_rewrite",
+                        "query": query[:100] + "..." if len(query) > 100 else query,
+                        "suggestion": suggestion,
+                        "avg_execution_time": round(total_time / frequency, 3),
+                        "frequency": frequency
+                    })
         
         return recommendations
     
@@ -353,15 +735,18 @@ class PerformanceOptimizer:
         optimizations = []
         optimized_query = query
         
-        # Add LIMIT if not present and query is potentially expensive
-        if not re.search(r'LIMIT\s+\d+', optimized_query, re.IGNORECASE):
-            # Check if it's a SELECT query without LIMIT
-            if re.match(r'^\s*SELECT\s+', optimized_query, re.IGNORECASE):
-                optimized_query += " LIMIT 1000"
+        # Add LIMIT to a SELECT without one (at the outermost clause boundary,
+        # so ORDER BY / UNION / OFFSET / trailing ";" stay valid)
+        if _RE_SELECT_PREFIX.match(optimized_query):
+            insertion = _limit_insertion_point(optimized_query)
+            if insertion is not None:
+                at, before_offset = insertion
+                limit = "LIMIT 1000 " if before_offset else " LIMIT 1000"
+                optimized_query = optimized_query[:at] + limit + optimized_query[at:]
                 optimizations.append("Added LIMIT 1000 to prevent excessive results")
         
         # Optimize JOIN order (simplified)
-        if 'JOIN' in optimized_query.upper():
+        if _RE_JOIN.search(optimized_query):
             # This is a simplified optimization - real JOIN order optimization
             # would require query parsing and cost estimation
             optimizations.append("JOIN order optimization suggested")
@@ -370,18 +755,36 @@ class PerformanceOptimizer:
     
     def clear_cache(self):
         """Clear performance cache"""
-        self.query_history.clear()
-        self.optimization_cache.clear()
-        
-        if self.cache_enabled:
+        with self._stats_lock:
+            self.query_history.clear()
+            self._history_timestamps.clear()
+            self._index_counts.clear()
+            self._index_details.clear()
+            self._rewrite_counts.clear()
+            self._rewrite_details.clear()
+            self.optimization_cache.clear()
+        
+        # Metrics still waiting for the writer belong to the cleared history
+        # (flush events and the shutdown sentinel are handed back to it)
+        keep = []
+        try:
+            while True:
+                item = self._metrics_queue.get_nowait()
+                if not isinstance(item, QueryMetrics):
+                    keep.append(item)
+        except queue.Empty:
+            pass
+        for item in keep:
+            self._metrics_queue.put(item)
+        
+        if self._redis_ready():
             try:
-                self.redis_client.delete("query_metrics")
-                # Clear query count keys
-                for key in self.redis_client.scan_iter(match="query_count:*"):
-                    self.redis_client.delete(key)
+                # Query counts live in one hash, so a single command clears them
+                self.redis_client.delete(_METRICS_KEY, _COUNTS_KEY)
                 self.logger.info("Performance cache cleared")
-            except Exception as e:
+            except (redis.RedisError, OSError) as e:
                 self.logger.error(f"Failed to clear Redis cache: {e}")
+                self._redis_failed(e)
 
 # Global performance optimizer instance
 performance_optimizer = PerformanceOptimizer()
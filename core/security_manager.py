@@ -1,15 +1,40 @@
 import hashlib
+import heapq
+import hmac
 import secrets
 import jwt
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Any
+from typing import ClassVar, Dict, FrozenSet, List, Optional, Tuple, Any
 from dataclasses import dataclass
 from enum import Enum
 import re
+import time
+import queue
 import logging
+import threading
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 import json
+import itertools
+from collections import OrderedDict, deque
+from operator import attrgetter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Suspicious SQL patterns, alternated so a query is scanned once
+_SUSPICIOUS_RE = re.compile(
+    r';\s*(?:DROP|DELETE|UPDATE|INSERT)'  # Multiple statements
+    r'|UNION\s+SELECT'  # Potential SQL injection
+    r'|--'  # SQL comments
+    r'|/\*.*?\*/'  # SQL comments
+    r'|EXEC\s*\('  # Execute function
+    r'|xp_cmdshell'  # Command execution
+    r'|sp_executesql',  # Dynamic SQL
+    re.IGNORECASE
+)
 
 class UserRole(Enum):
     """User roles with hierarchical permissions"""
@@ -30,6 +55,27 @@ class Permission(Enum):
     EXPORT_DATA = "export_data"
     MANAGE_SECURITY = "manage_security"
 
+# Bit per permission for the packed "pm" claim in JWTs. Issued tokens carry
+# these values, so they are pinned: never renumber, give new permissions new bits.
+PERMISSION_BITS: Dict[Permission, int] = {
+    Permission.READ_DATA: 1 << 0,
+    Permission.WRITE_DATA: 1 << 1,
+    Permission.DELETE_DATA: 1 << 2,
+    Permission.MANAGE_USERS: 1 << 3,
+    Permission.MANAGE_DATABASES: 1 << 4,
+    Permission.VIEW_SCHEMA: 1 << 5,
+    Permission.EXECUTE_QUERY: 1 << 6,
+    Permission.EXPORT_DATA: 1 << 7,
+    Permission.MANAGE_SECURITY: 1 << 8,
+}
+
+def permission_mask(permissions) -> int:
+    """Pack permissions into an integer bitmask"""
+    mask = 0
+    for permission in permissions:
+        mask |= PERMISSION_BITS[permission]
+    return mask
+
 @dataclass
 class User:
     """User entity"""
@@ -37,12 +83,13 @@ class User:
     username: str
     email: str
     role: UserRole
-    permissions: List[Permission]
+    permissions: FrozenSet[Permission]
     created_at: datetime
     last_login: Optional[datetime] = None
     is_active: bool = True
     failed_login_attempts: int = 0
     locked_until: Optional[datetime] = None
+    password_hash: Optional[str] = None
 
 @dataclass
 class SecurityPolicy:
@@ -54,6 +101,7 @@ class SecurityPolicy:
     require_special_chars: bool = True
     jwt_secret_key: str = "your-secret-key-change-in-production"
     jwt_algorithm: str = "HS256"
+    bcrypt_rounds: int = 12
     allowed_origins: List[str] = None
 
 @dataclass
@@ -68,37 +116,125 @@ class AuditLog:
     success: bool
     details: Dict[str, Any] = None
 
+# One pass over a query for check_query_permission: the leading write verb
+# (prefix match, like str.startswith on the stripped, upper-cased query),
+# any DROP, and any suspicious pattern
+_QUERY_SCAN_RE = re.compile(
+    r'\A\s*(?P<verb>DELETE|INSERT|UPDATE)'
+    r'|(?P<drop>DROP)'
+    r'|(?P<suspicious>' + _SUSPICIOUS_RE.pattern + r')',
+    re.IGNORECASE
+)
+
+# Fields of an AuditLog returned by get_audit_logs, fetched with one attrgetter call
+_AUDIT_FIELDS = ("timestamp", "user_id", "action", "resource", "ip_address", "success", "details")
+_audit_values = attrgetter(*_AUDIT_FIELDS)
+
+# Leading statement verbs that need a permission beyond EXECUTE_QUERY
+_VERB_PERMISSIONS = {
+    "DELETE": (Permission.DELETE_DATA, "No permission to delete data"),
+    "INSERT": (Permission.WRITE_DATA, "No permission to write data"),
+    "UPDATE": (Permission.WRITE_DATA, "No permission to write data"),
+}
+
+def _scan_query(query: str) -> Tuple[Optional[str], bool, bool]:
+    """(leading write verb or None, contains DROP?, contains a suspicious pattern?)"""
+    verb = None
+    drop = suspicious = False
+    for match in _QUERY_SCAN_RE.finditer(query):
+        kind = match.lastgroup
+        if kind == "verb":
+            verb = match.group("verb").upper()
+        elif kind == "drop":
+            drop = True
+        else:
+            suspicious = True
+            # e.g. "; DROP" or a comment around DROP, consumed by the suspicious match
+            if "DROP" in match.group().upper():
+                drop = True
+        if drop and suspicious:
+            break
+    return verb, drop, suspicious
+
+def _details_json(details: Dict[str, Any]) -> str:
+    """Compact JSON for audit details (orjson when installed)"""
+    if orjson is not None:
+        return orjson.dumps(details, default=str).decode("utf-8")
+    return json.dumps(details, separators=(",", ":"), default=str)
+
 class SecurityManager:
     """Comprehensive security management system"""
     
+    # Role-based permissions mapping (immutable sets, shared by every user of a role)
+    ROLE_PERMISSIONS: ClassVar[Dict[UserRole, FrozenSet[Permission]]] = {
+        UserRole.ADMIN: frozenset({
+            Permission.READ_DATA, Permission.WRITE_DATA, Permission.DELETE_DATA,
+            Permission.MANAGE_USERS, Permission.MANAGE_DATABASES, Permission.VIEW_SCHEMA,
+            Permission.EXECUTE_QUERY, Permission.EXPORT_DATA, Permission.MANAGE_SECURITY
+        }),
+        UserRole.ANALYST: frozenset({
+            Permission.READ_DATA, Permission.VIEW_SCHEMA, Permission.EXECUTE_QUERY, Permission.EXPORT_DATA
+        }),
+        UserRole.VIEWER: frozenset({
+            Permission.READ_DATA, Permission.VIEW_SCHEMA
+        }),
+        UserRole.GUEST: frozenset({
+            Permission.READ_DATA
+        })
+    }
+    # Instance-style alias kept for existing callers
+    role_permissions = ROLE_PERMISSIONS
+    
     def __init__(self, policy: SecurityPolicy = None):
         self.policy = policy or SecurityPolicy()
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto",
+                                        bcrypt__rounds=self.policy.bcrypt_rounds)
         self.users: Dict[str, User] = {}
+        self._by_username: Dict[str, str] = {}  # username -> user id
+        self._by_email: Dict[str, str] = {}  # email -> user id
+        # (locked_until, user id) for account lockouts; entries are dropped
+        # lazily once expired or superseded
+        self._lock_heap: List[Tuple[datetime, str]] = []
+        
+        # Per-user state (failed attempts, lockout) is updated under one of
+        # a few sharded locks, so logins for different users don't contend;
+        # registration and the lockout heap have their own locks
+        self._user_locks = [threading.Lock() for _ in range(16)]
+        self._registry_lock = threading.Lock()
+        self._lock_heap_lock = threading.Lock()
         self.sessions: Dict[str, Dict] = {}
-        self.audit_logs: List[AuditLog] = []
+        self.audit_logs: deque = deque(maxlen=10000)  # Last 10000 audit logs
         self.logger = logging.getLogger(__name__)
         
+        # (user_id, query, database) -> time the query was last allowed
+        self._query_permission_cache: Dict[Tuple[str, str, str], float] = {}
+        self.permission_cache_ttl = 5.0
+        self.permission_cache_size = 4096
+        
+        # HMAC of (hash, password) -> (time verified, result); repeated logins
+        # within password_cache_ttl seconds skip the bcrypt verify
+        self._password_cache: "OrderedDict[bytes, Tuple[float, bool]]" = OrderedDict()
+        self._password_cache_key = secrets.token_bytes(32)
+        self.password_cache_ttl = 60.0
+        self.password_cache_size = 1000
+        self._password_cache_lock = threading.Lock()
+        
+        # blake2b(token) -> (exp, payload) for verified tokens, in LRU order;
+        # set jwt_cache_size to 0 to verify every token with jwt.decode
+        self._jwt_cache: "OrderedDict[bytes, Tuple[float, Dict]]" = OrderedDict()
+        self.jwt_cache_size = 10000
+        self._jwt_cache_lock = threading.Lock()
+        
+        # Audit lines are written to the logger by a background thread, in
+        # batches of up to audit_batch_size or every audit_flush_interval seconds
+        self.audit_batch_size = 100
+        self.audit_flush_interval = 0.05
+        self._audit_queue: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._audit_writer = threading.Thread(target=self._audit_write_loop, name="audit-log-writer", daemon=True)
+        self._audit_writer.start()
+        
         # Initialize default admin user
         self._initialize_default_users()
-        
-        # Role-based permissions mapping
-        self.role_permissions = {
-            UserRole.ADMIN: [
-                Permission.READ_DATA, Permission.WRITE_DATA, Permission.DELETE_DATA,
-                Permission.MANAGE_USERS, Permission.MANAGE_DATABASES, Permission.VIEW_SCHEMA,
-                Permission.EXECUTE_QUERY, Permission.EXPORT_DATA, Permission.MANAGE_SECURITY
-            ],
-            UserRole.ANALYST: [
-                Permission.READ_DATA, Permission.VIEW_SCHEMA, Permission.EXECUTE_QUERY, Permission.EXPORT_DATA
-            ],
-            UserRole.VIEWER: [
-                Permission.READ_DATA, Permission.VIEW_SCHEMA
-            ],
-            UserRole.GUEST: [
-                Permission.READ_DATA
-            ]
-        }
     
     def _initialize_default_users(self):
         """Initialize default admin user"""
@@ -108,20 +244,44 @@ class SecurityManager:
             username="admin",
             email="admin@neurosql.com",
             role=UserRole.ADMIN,
-            permissions=self.role_permissions[UserRole.ADMIN],
-            created_at=datetime.now()
+            permissions=self.ROLE_PERMISSIONS[UserRole.ADMIN],
+            created_at=datetime.now(),
+            password_hash=admin_password
         )
         
-        self.users["admin"] = admin_user
+        self._add_user(admin_user)
         self.logger.info("Default admin user initialized")
     
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        """The shard lock guarding user_id's mutable login state"""
+        return self._user_locks[hash(user_id) % len(self._user_locks)]
+    
+    def _add_user(self, user: User):
+        """Register user in self.users and the username/email indexes"""
+        self.users[user.id] = user
+        self._by_username[user.username] = user.id
+        self._by_email[user.email] = user.id
+    
     def hash_password(self, password: str) -> str:
         """Hash password using bcrypt"""
         return self.pwd_context.hash(password)
     
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """Verify password against hash"""
-        return self.pwd_context.verify(plain_password, hashed_password)
+        """Verify password against hash (results are cached for password_cache_ttl seconds)"""
+        key = hmac.new(self._password_cache_key, f"{hashed_password}:{plain_password}".encode(), "sha256").digest()
+        with self._password_cache_lock:
+            cached = self._password_cache.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.password_cache_ttl:
+                return cached[1]
+        
+        # bcrypt runs outside the lock so concurrent logins verify in parallel
+        result = self.pwd_context.verify(plain_password, hashed_password)
+        with self._password_cache_lock:
+            self._password_cache[key] = (time.monotonic(), result)
+            self._password_cache.move_to_end(key)
+            if len(self._password_cache) > self.password_cache_size:
+                self._password_cache.popitem(last=False)
+        return result
     
     def validate_password_strength(self, password: str) -> Tuple[bool, str]:
         """Validate password strength"""
@@ -148,13 +308,13 @@ class SecurityManager:
             return False, message
         
         # Check if user already exists
-        if any(u.username == username for u in self.users.values()):
+        if username in self._by_username:
             return False, "Username already exists"
         
-        if any(u.email == email for u in self.users.values()):
+        if email in self._by_email:
             return False, "Email already exists"
         
-        # Create user
+        # Create user (hashing happens outside the registry lock)
         user_id = secrets.token_hex(8)
         hashed_password = self.hash_password(password)
         
@@ -163,148 +323,198 @@ class SecurityManager:
             username=username,
             email=email,
             role=role,
-            permissions=self.role_permissions[role],
-            created_at=datetime.now()
+            permissions=self.ROLE_PERMISSIONS[role],
+            created_at=datetime.now(),
+            password_hash=hashed_password
         )
         
-        self.users[user_id] = new_user
+        with self._registry_lock:
+            # Re-check: another request may have registered the name meanwhile
+            if username in self._by_username:
+                return False, "Username already exists"
+            if email in self._by_email:
+                return False, "Email already exists"
+            self._add_user(new_user)
+        self._query_permission_cache.clear()
         self.logger.info(f"User created: {username} ({role.value})")
         
         return True, "User created successfully"
     
     def authenticate_user(self, username: str, password: str, ip_address: str = "unknown", user_agent: str = "unknown") -> Tuple[Optional[str], str]:
         """Authenticate user and return JWT token"""
+        now = datetime.now()
+        
         # Find user
-        user = None
-        for u in self.users.values():
-            if u.username == username:
-                user = u
-                break
+        user = self.get_user_by_username(username)
         
         if not user:
-            self._log_audit(None, "login_failed", "authentication", ip_address, user_agent, False, {"username": username})
+            self._log_audit(None, "login_failed", "authentication", ip_address, user_agent, False, {"username": username}, timestamp=now)
             return None, "Invalid credentials"
         
         # Check if user is locked
-        if user.locked_until and user.locked_until > datetime.now():
-            self._log_audit(user.id, "login_blocked", "authentication", ip_address, user_agent, False, {"reason": "account_locked"})
+        if user.locked_until and user.locked_until > now:
+            self._log_audit(user.id, "login_blocked", "authentication", ip_address, user_agent, False, {"reason": "account_locked"}, timestamp=now)
             return None, f"Account locked until {user.locked_until}"
         
         # Check if user is active
         if not user.is_active:
-            self._log_audit(user.id, "login_blocked", "authentication", ip_address, user_agent, False, {"reason": "account_inactive"})
+            self._log_audit(user.id, "login_blocked", "authentication", ip_address, user_agent, False, {"reason": "account_inactive"}, timestamp=now)
             return None, "Account is inactive"
         
         # Verify password
-        if not self.verify_password(password, user.id):  # Note: In real implementation, store hashed password separately
-            user.failed_login_attempts += 1
+        # (bcrypt runs before taking the user's lock)
+        if not user.password_hash or not self.verify_password(password, user.password_hash):
+            with self._user_lock(user.id):
+                user.failed_login_attempts += 1
+                attempts = user.failed_login_attempts
+                
+                # Lock account if too many failed attempts
+                locked = attempts >= self.policy.max_failed_attempts
+                if locked:
+                    user.locked_until = now + timedelta(minutes=self.policy.lockout_duration_minutes)
+                    with self._lock_heap_lock:
+                        heapq.heappush(self._lock_heap, (user.locked_until, user.id))
             
-            # Lock account if too many failed attempts
-            if user.failed_login_attempts >= self.policy.max_failed_attempts:
-                user.locked_until = datetime.now() + timedelta(minutes=self.policy.lockout_duration_minutes)
-                self._log_audit(user.id, "account_locked", "security", ip_address, user_agent, False, {"attempts": user.failed_login_attempts})
+            if locked:
+                self._log_audit(user.id, "account_locked", "security", ip_address, user_agent, False, {"attempts": attempts}, timestamp=now)
                 return None, f"Account locked due to too many failed attempts"
             
-            self._log_audit(user.id, "login_failed", "authentication", ip_address, user_agent, False, {"attempts": user.failed_login_attempts})
+            self._log_audit(user.id, "login_failed", "authentication", ip_address, user_agent, False, {"attempts": attempts}, timestamp=now)
             return None, "Invalid credentials"
         
         # Successful login
-        user.failed_login_attempts = 0
-        user.locked_until = None
-        user.last_login = datetime.now()
+        with self._user_lock(user.id):
+            user.failed_login_attempts = 0
+            user.locked_until = None
+            user.last_login = now
         
         # Generate JWT token
         token = self._generate_jwt_token(user)
         
-        self._log_audit(user.id, "login_success", "authentication", ip_address, user_agent, True)
+        self._log_audit(user.id, "login_success", "authentication", ip_address, user_agent, True, timestamp=now)
         
         return token, "Login successful"
     
     def _generate_jwt_token(self, user: User) -> str:
         """Generate JWT token for user"""
+        issued_at = datetime.utcnow()
         payload = {
             "user_id": user.id,
             "username": user.username,
             "role": user.role.value,
-            "permissions": [p.value for p in user.permissions],
-            "exp": datetime.utcnow() + timedelta(hours=self.policy.session_timeout_hours),
-            "iat": datetime.utcnow()
+            "pm": permission_mask(user.permissions),
+            "exp": issued_at + timedelta(hours=self.policy.session_timeout_hours),
+            "iat": issued_at
         }
         
         return jwt.encode(payload, self.policy.jwt_secret_key, algorithm=self.policy.jwt_algorithm)
     
     def verify_jwt_token(self, token: str) -> Optional[Dict]:
-        """Verify JWT token and return payload"""
+        """
+        Verify JWT token and return payload (valid tokens are cached until they
+        expire; callers get their own copy, so the cached claims cannot be changed)
+        """
+        key = None
+        if self.jwt_cache_size:
+            key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+            with self._jwt_cache_lock:
+                cached = self._jwt_cache.get(key)
+                if cached is not None:
+                    if cached[0] > time.time():
+                        self._jwt_cache.move_to_end(key)
+                        return dict(cached[1])
+                    del self._jwt_cache[key]
+        
+        # PyJWT's HS256 signature already runs in OpenSSL (via hashlib/hmac);
+        # claim validation stays with the library rather than a hand-rolled verifier
         try:
             payload = jwt.decode(token, self.policy.jwt_secret_key, algorithms=[self.policy.jwt_algorithm])
-            return payload
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
             return None
+        
+        if key is not None and "exp" in payload:
+            with self._jwt_cache_lock:
+                self._jwt_cache[key] = (payload["exp"], payload)
+                if len(self._jwt_cache) > self.jwt_cache_size:
+                    self._jwt_cache.popitem(last=False)
+            return dict(payload)
+        return payload
+    
+    @staticmethod
+    def token_has_permission(payload: Dict, permission: Permission) -> bool:
+        """Permission check on a verified JWT payload (older tokens carry a "permissions" list)"""
+        if "pm" in payload:
+            return bool(payload["pm"] & PERMISSION_BITS[permission])
+        return permission.value in payload.get("permissions", ())
     
     def check_permission(self, user_id: str, permission: Permission) -> bool:
         """Check if user has specific permission"""
-        user = self.users.get(user_id)
+        return self._user_has_permission(self.users.get(user_id), permission)
+    
+    @staticmethod
+    def _user_has_permission(user: Optional[User], permission: Permission) -> bool:
+        """Permission check on an already resolved user"""
         if not user or not user.is_active:
             return False
         
         return permission in user.permissions
     
-    def check_query_permission(self, user_id: str, query: str, database: str = "default") -> Tuple[bool, str]:
-        """Check if user is allowed to execute specific query"""
-        user = self.users.get(user_id)
+    def check_query_permission(self, user_id: str, query: str, database: str = "default", user: Optional[User] = None) -> Tuple[bool, str]:
+        """
+        Check if user is allowed to execute specific query
+        
+        Allowed results are cached for permission_cache_ttl seconds; pass an
+        already resolved ``user`` to skip the lookup.
+        """
+        cache_key = (user_id, query, database)
+        allowed_at = self._query_permission_cache.get(cache_key)
+        if allowed_at is not None and time.monotonic() - allowed_at < self.permission_cache_ttl:
+            return True, "Query allowed"
+        
+        if user is None:
+            user = self.users.get(user_id)
         if not user:
             return False, "User not found"
         
         # Check basic execute permission
-        if not self.check_permission(user_id, Permission.EXECUTE_QUERY):
+        if not self._user_has_permission(user, Permission.EXECUTE_QUERY):
             return False, "No permission to execute queries"
         
-        # Check for dangerous operations
-        query_upper = query.upper().strip()
+        verb, has_drop, suspicious = _scan_query(query)
         
-        # Check for DELETE operations
-        if query_upper.startswith('DELETE') and not self.check_permission(user_id, Permission.DELETE_DATA):
-            return False, "No permission to delete data"
+        # Check for DELETE/INSERT/UPDATE operations
+        if verb:
+            permission, message = _VERB_PERMISSIONS[verb]
+            if not self._user_has_permission(user, permission):
+                return False, message
         
         # Check for DROP operations
-        if 'DROP' in query_upper and not self.check_permission(user_id, Permission.MANAGE_DATABASES):
+        if has_drop and not self._user_has_permission(user, Permission.MANAGE_DATABASES):
             return False, "No permission to modify database structure"
         
-        # Check for INSERT/UPDATE operations
-        if (query_upper.startswith('INSERT') or query_upper.startswith('UPDATE')) and not self.check_permission(user_id, Permission.WRITE_DATA):
-            return False, "No permission to write data"
-        
         # Additional security checks
-        if self._contains_suspicious_patterns(query):
+        if suspicious:
             self._log_audit(user_id, "suspicious_query_blocked", "security", "unknown", "unknown", False, {"query": query[:100]})
             return False, "Query contains suspicious patterns"
         
+        # Only allowed results are cached, so denials keep their audit trail
+        if len(self._query_permission_cache) >= self.permission_cache_size:
+            self._query_permission_cache.clear()
+        self._query_permission_cache[cache_key] = time.monotonic()
+        
         return True, "Query allowed"
     
     def _contains_suspicious_patterns(self, query: str) -> bool:
         """Check for suspicious SQL patterns"""
-        suspicious_patterns = [
-            r';\s*(DROP|DELETE|UPDATE|INSERT)',  # Multiple statements
-            r'UNION\s+SELECT',  # Potential SQL injection
-            r'--',  # SQL comments
-            r'/\*.*\*/',  # SQL comments
-            r'EXEC\s*\(',  # Execute function
-            r'xp_cmdshell',  # Command execution
-            r'sp_executesql',  # Dynamic SQL
-        ]
-        
-        for pattern in suspicious_patterns:
-            if re.search(pattern, query, re.IGNORECASE):
-                return True
-        
-        return False
+        return _SUSPICIOUS_RE.search(query) is not None
     
-    def _log_audit(self, user_id: Optional[str], action: str, resource: str, ip_address: str, user_agent: str, success: bool, details: Dict = None):
-        """Log security audit event"""
+    def _log_audit(self, user_id: Optional[str], action: str, resource: str, ip_address: str, user_agent: str, success: bool, details: Dict = None,
+                   timestamp: Optional[datetime] = None):
+        """Log security audit event (timestamp defaults to now; queued writers pass the event time)"""
         audit_log = AuditLog(
-            timestamp=datetime.now(),
+            timestamp=timestamp or datetime.now(),
             user_id=user_id or "anonymous",
             action=action,
             resource=resource,
@@ -316,20 +526,60 @@ class SecurityManager:
         
         self.audit_logs.append(audit_log)
         
-        # Keep only last 10000 audit logs
-        if len(self.audit_logs) > 10000:
-            self.audit_logs = self.audit_logs[-10000:]
+        # Log to file (off the request thread)
+        self._audit_queue.put(audit_log)
+    
+    def _audit_write_loop(self):
+        """Collect queued audit logs into batches and write each batch"""
+        while True:
+            batch = [self._audit_queue.get()]
+            deadline = time.monotonic() + self.audit_flush_interval
+            while len(batch) < self.audit_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._audit_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_audit_batch(batch)
+    
+    def _write_audit_batch(self, batch: List[Any]):
+        """
+        One logger call per level for the audit logs in batch, then release any
+        flush() waiters. Details are serialized here, off the request thread.
+        """
+        succeeded, failed, waiters = [], [], []
+        for item in batch:
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+                continue
+            line = f"AUDIT: {item.action} by {item.user_id} on {item.resource} - {'SUCCESS' if item.success else 'FAILED'}"
+            if item.details:
+                line = f"{line} {_details_json(item.details)}"
+            (succeeded if item.success else failed).append(line)
         
-        # Log to file
-        log_level = logging.INFO if success else logging.WARNING
-        self.logger.log(log_level, f"AUDIT: {action} by {user_id} on {resource} - {'SUCCESS' if success else 'FAILED'}")
+        try:
+            if succeeded:
+                self.logger.info("\n".join(succeeded))
+            if failed:
+                self.logger.warning("\n".join(failed))
+        except Exception as e:
+            print(f"⚠️ Audit logging failed: {e}")
+        finally:
+            for waiter in waiters:
+                waiter.set()
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until audit logs queued so far have been written (e.g. at shutdown)"""
+        done = threading.Event()
+        self._audit_queue.put(done)
+        return done.wait(timeout)
     
     def get_user_by_username(self, username: str) -> Optional[User]:
         """Get user by username"""
-        for user in self.users.values():
-            if user.username == username:
-                return user
-        return None
+        user_id = self._by_username.get(username)
+        return self.users.get(user_id) if user_id else None
     
     def get_user(self, user_id: str) -> Optional[User]:
         """Get user by ID"""
@@ -346,7 +596,8 @@ class SecurityManager:
         
         old_role = user.role
         user.role = new_role
-        user.permissions = self.role_permissions[new_role]
+        user.permissions = self.ROLE_PERMISSIONS[new_role]
+        self._query_permission_cache.clear()
         
         self._log_audit(admin_user_id, "role_updated", "user_management", "unknown", "unknown", True, {
             "target_user": target_user_id,
@@ -366,6 +617,7 @@ class SecurityManager:
             return False, "User not found"
         
         user.is_active = False
+        self._query_permission_cache.clear()
         
         self._log_audit(admin_user_id, "user_deactivated", "user_management", "unknown", "unknown", True, {
             "target_user": target_user_id
@@ -378,19 +630,27 @@ class SecurityManager:
         if not self.check_permission(admin_user_id, Permission.MANAGE_SECURITY):
             return []
         
-        recent_logs = self.audit_logs[-limit:]
-        return [
-            {
-                "timestamp": log.timestamp.isoformat(),
-                "user_id": log.user_id,
-                "action": log.action,
-                "resource": log.resource,
-                "ip_address": log.ip_address,
-                "success": log.success,
-                "details": log.details
-            }
-            for log in recent_logs
-        ]
+        recent_logs = itertools.islice(self.audit_logs, max(0, len(self.audit_logs) - limit), None)
+        records = [dict(zip(_AUDIT_FIELDS, values)) for values in map(_audit_values, recent_logs)]
+        for record in records:
+            record["timestamp"] = record["timestamp"].isoformat()
+        return records
+    
+    def _count_locked_users(self) -> int:
+        """Number of currently locked accounts, pruning expired/superseded lockouts"""
+        now = datetime.now()
+        with self._lock_heap_lock:
+            heap = self._lock_heap
+            while heap and heap[0][0] <= now:
+                heapq.heappop(heap)
+            
+            # A user relocked or unlocked since the push no longer matches its entry
+            live = [entry for entry in heap
+                    if entry[1] in self.users and self.users[entry[1]].locked_until == entry[0]]
+            if len(live) != len(heap):
+                heapq.heapify(live)
+                self._lock_heap = live
+            return len(live)
     
     def get_security_stats(self, admin_user_id: str) -> Dict:
         """Get security statistics (admin only)"""
@@ -399,11 +659,16 @@ class SecurityManager:
         
         total_users = len(self.users)
         active_users = sum(1 for u in self.users.values() if u.is_active)
-        locked_users = sum(1 for u in self.users.values() if u.locked_until and u.locked_until > datetime.now())
-        
-        # Recent failed logins
-        recent_failed = sum(1 for log in self.audit_logs[-1000:] if log.action == "login_failed")
-        recent_successful = sum(1 for log in self.audit_logs[-1000:] if log.action == "login_success")
+        locked_users = self._count_locked_users()
+        
+        # Recent logins, over the last 1000 audit logs
+        recent_failed = recent_successful = 0
+        for log in itertools.islice(reversed(self.audit_logs), 1000):
+            action = log.action
+            if action == "login_failed":
+                recent_failed += 1
+            elif action == "login_success":
+                recent_successful += 1
         
         return {
             "total_users": total_users,
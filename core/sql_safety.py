@@ -2,16 +2,74 @@
 
 import re
 
+# Planner-shaped queries: SELECT <plain/aggregate columns> FROM <table> [WHERE ...]
+# (matched against the upper-cased SQL)
+_SIMPLE_SELECT_RE = re.compile(
+    r"^SELECT\s+(?P<cols>(?:\w+\((?:\*|\w+)\)|\*|\w+)(?:\s*,\s*(?:\w+\((?:\*|\w+)\)|\*|\w+))*)"
+    r"\s+FROM\s+(?P<table>\w+)(?:\s+WHERE\s+[^;]*)?$"
+)
+_TABLE_KEYWORD_RE = re.compile(r"\b(?:FROM|JOIN)\b")
+_TABLE_KEYWORDS = frozenset({"FROM", "JOIN"})
+
+# id(schema["tables"]) -> (schema["tables"], (table names, upper-cased column names));
+# holding the dict keeps its id from being reused while cached
+_schema_names = {}
+_SCHEMA_NAMES_SIZE = 16
+
 class SQLSafetyError(Exception):
     pass
 
+def _get_schema_names(tables):
+    cached = _schema_names.get(id(tables))
+    if cached is not None and cached[0] is tables:
+        return cached[1]
+
+    names = (
+        frozenset(tables.keys()),
+        frozenset(c.upper() for cols in tables.values() for c in cols),
+    )
+    if len(_schema_names) >= _SCHEMA_NAMES_SIZE:
+        _schema_names.clear()
+    _schema_names[id(tables)] = (tables, names)
+    return names
+
+def _is_simple_safe_select(sql_upper, schema_tables, schema_columns):
+    # True only for queries the full checks below would also accept
+    match = _SIMPLE_SELECT_RE.match(sql_upper)
+    if not match or len(_TABLE_KEYWORD_RE.findall(sql_upper)) != 1:
+        return False
+
+    cols = match.group("cols")
+    if "FROM" in cols or "SELECT" in cols or match.group("table") not in schema_tables:
+        return False
+
+    for c in cols.split(","):
+        c = c.strip()
+        if "(" in c:
+            c = c[c.find("(")+1:-1]
+        if c != "*" and c not in schema_columns:
+            return False
+
+    return True
+
 def extract_tables(sql):
     # Very simple extractor (enough for your project)
-    tokens = re.split(r"\s+", sql.upper())
+    return _tables_from_tokens(_split_tokens(sql.upper()))
+
+def _split_tokens(sql):
+    # Whitespace split; like the former re.split(r"\s+"), trailing whitespace
+    # leaves an empty last token (so a trailing "FROM " names table "")
+    tokens = sql.split()
+    if sql[-1:].isspace():
+        tokens.append("")
+    return tokens
+
+def _tables_from_tokens(tokens):
+    # tokens: the upper-cased SQL split on whitespace
     tables = []
 
     for i, tok in enumerate(tokens):
-        if tok in ["FROM", "JOIN"] and i + 1 < len(tokens):
+        if tok in _TABLE_KEYWORDS and i + 1 < len(tokens):
             t = tokens[i + 1].replace(",", "").strip()
             tables.append(t)
 
@@ -19,7 +77,10 @@ def extract_tables(sql):
 
 def extract_columns(sql):
     # Only checks SELECT part
-    sql = sql.upper()
+    return _columns_from_upper(sql.upper())
+
+def _columns_from_upper(sql):
+    # sql: already upper-cased
     if "SELECT" not in sql or "FROM" not in sql:
         return []
 
@@ -52,27 +113,26 @@ def validate_sql(sql, schema):
     if "FROM NONE" in sql_upper:
         raise SQLSafetyError("Table resolution failed")
 
-    # 3. Check tables
-    schema_tables = set(schema["tables"].keys())
+    schema_tables, schema_columns = _get_schema_names(schema["tables"])
+
+    # Planner-shaped queries are fully checked by one regex match
+    if _is_simple_safe_select(sql_upper, schema_tables, schema_columns):
+        return True
 
-    used_tables = extract_tables(sql_upper)
+    # 3. Check tables
+    used_tables = _tables_from_tokens(_split_tokens(sql_upper))
 
     for t in used_tables:
         if t not in schema_tables:
             raise SQLSafetyError(f"Illegal table used: {t}")
 
     # 4. Check columns
-    schema_columns = set()
-    for t, cols in schema["tables"].items():
-        for c in cols:
-            schema_columns.add(c.upper())
-
-    used_columns = extract_columns(sql_upper)
+    used_columns = _columns_from_upper(sql_upper)
 
     for c in used_columns:
         if c == "*" or c == "":
             continue
-        if c.upper() not in schema_columns:
+        if c not in schema_columns:
             raise SQLSafetyError(f"Illegal column used: {c}")
 
     # 5. Basic sanity
@@ -0,0 +1,80 @@
+import queue
+import sqlite3
+import logging
+from contextlib import contextmanager
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+# Read-optimized settings applied to every connection we open
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+)
+
+# Prepared statements kept per connection by the sqlite3 module (default 128);
+# with the WHERE value bound as a parameter, repeated query shapes hit it
+STATEMENT_CACHE_SIZE = 256
+
+
+def apply_sqlite_pragmas(conn) -> None:
+    """Apply SQLITE_PRAGMAS to an open DB-API connection"""
+    cursor = conn.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Open a SQLite connection with the pool's PRAGMAs applied"""
+    conn = sqlite3.connect(db_path, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    apply_sqlite_pragmas(conn)
+    return conn
+
+
+def _is_memory_db(db_path: str) -> bool:
+    return db_path == ":memory:" or db_path.startswith("file::memory:")
+
+
+class SQLitePool:
+    """One writer connection plus a bounded queue of reader connections"""
+
+    def __init__(self, db_path: str, readers: int = 4):
+        self.db_path = db_path
+        self.writer = connect(db_path)
+
+        # In-memory databases are private to a connection, so readers
+        # must share the writer there
+        self.size = 0 if _is_memory_db(db_path) else readers
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=self.size)
+        for _ in range(self.size):
+            self._readers.put(connect(db_path))
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Check out a read connection (blocks while all are in use)"""
+        if self.size == 0:
+            yield self.writer
+            return
+
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def close(self) -> None:
+        """Close the writer and every idle reader"""
+        while self.size:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self.writer.close()
+        logger.info(f"Closed SQLite pool for {self.db_path}")
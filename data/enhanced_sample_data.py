@@ -8,12 +8,23 @@ import random
 from datetime import datetime, timedelta
 import json
 
+# Bulk-load settings for the generator's connection (WAL is persistent, and
+# matches what the app's own connections use)
+LOAD_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+)
+
 class EnhancedSampleDataGenerator:
     """Generate comprehensive sample data for testing"""
     
     def __init__(self, db_path="enhanced_database.db"):
         self.db_path = db_path
         self.conn = sqlite3.connect(db_path)
+        for pragma in LOAD_PRAGMAS:
+            self.conn.execute(pragma)
         self.cursor = self.conn.cursor()
         
         # Sample data
@@ -53,7 +64,7 @@ class EnhancedSampleDataGenerator:
                 id INTEGER PRIMARY KEY,
                 first_name TEXT NOT NULL,
                 last_name TEXT NOT NULL,
-                email TEXT UNIQUE,
+                email TEXT,
                 age INTEGER,
                 gpa REAL,
                 enrollment_date DATE,
@@ -69,8 +80,8 @@ class EnhancedSampleDataGenerator:
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS departments (
                 id INTEGER PRIMARY KEY,
-                name TEXT UNIQUE NOT NULL,
-                code TEXT UNIQUE NOT NULL,
+                name TEXT NOT NULL,
+                code TEXT NOT NULL,
                 head_name TEXT,
                 building TEXT,
                 budget REAL,
@@ -83,7 +94,7 @@ class EnhancedSampleDataGenerator:
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS courses (
                 id INTEGER PRIMARY KEY,
-                code TEXT UNIQUE NOT NULL,
+                code TEXT NOT NULL,
                 title TEXT NOT NULL,
                 description TEXT,
                 credits INTEGER,
@@ -104,7 +115,7 @@ class EnhancedSampleDataGenerator:
                 id INTEGER PRIMARY KEY,
                 first_name TEXT NOT NULL,
                 last_name TEXT NOT NULL,
-                email TEXT UNIQUE,
+                email TEXT,
                 phone TEXT,
                 department_id INTEGER,
                 hire_date DATE,
@@ -172,7 +183,7 @@ class EnhancedSampleDataGenerator:
                 id INTEGER PRIMARY KEY,
                 title TEXT NOT NULL,
                 author TEXT,
-                isbn TEXT UNIQUE,
+                isbn TEXT,
                 category TEXT,
                 publication_year INTEGER,
                 available_copies INTEGER,
@@ -204,6 +215,7 @@ class EnhancedSampleDataGenerator:
         """Populate departments table"""
         print("📚 Populating departments...")
         
+        rows = []
         for i, dept_name in enumerate(self.departments, 1):
             code = dept_name[:3].upper()
             head_name = f"Dr. {random.choice(self.first_names)} {random.choice(self.last_names)}"
@@ -211,10 +223,12 @@ class EnhancedSampleDataGenerator:
             budget = random.uniform(500000, 2000000)
             established_year = random.randint(1950, 2000)
             
-            self.cursor.execute("""
+            rows.append((i, dept_name, code, head_name, building, budget, established_year))
+        
+        self.cursor.executemany("""
                 INSERT INTO departments (id, name, code, head_name, building, budget, established_year)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (i, dept_name, code, head_name, building, budget, established_year))
+            """, rows)
         
         print(f"✅ {len(self.departments)} departments added")
     
@@ -222,27 +236,33 @@ class EnhancedSampleDataGenerator:
         """Populate students table"""
         print(f"👨‍🎓 Populating {num_students} students...")
         
-        for i in range(1, num_students + 1):
-            first_name = random.choice(self.first_names)
-            last_name = random.choice(self.last_names)
+        # Each column is drawn in one random.choices call rather than per row
+        n = num_students
+        first_names = random.choices(self.first_names, k=n)
+        last_names = random.choices(self.last_names, k=n)
+        ages = random.choices(range(18, 36), k=n)
+        days_ago = random.choices(range(0, 1461), k=n)  # Enrolled within the last 4 years
+        years_to_graduate = random.choices(range(3, 7), k=n)
+        department_ids = random.choices(range(1, len(self.departments) + 1), k=n)
+        scholarships = random.choices([0, 0, 0, 1000, 2500, 5000, 10000], k=n)
+        now = datetime.now()
+        
+        rows = []
+        for i, first_name, last_name, age, days, years, department_id, scholarship_amount in zip(
+                range(1, n + 1), first_names, last_names, ages, days_ago,
+                years_to_graduate, department_ids, scholarships):
             email = f"{first_name.lower()}.{last_name.lower()}{i}@university.edu"
-            age = random.randint(18, 35)
             gpa = round(random.uniform(2.0, 4.0), 2)
+            enrollment_date = (now - timedelta(days=days)).date()
             
-            # Random enrollment date within last 4 years
-            days_ago = random.randint(0, 1460)  # 4 years in days
-            enrollment_date = (datetime.now() - timedelta(days=days_ago)).date()
-            
-            graduation_year = enrollment_date.year + random.randint(3, 6)
-            department_id = random.randint(1, len(self.departments))
-            scholarship_amount = random.choice([0, 0, 0, 1000, 2500, 5000, 10000])
-            
-            self.cursor.execute("""
+            rows.append((i, first_name, last_name, email, age, gpa,
+                         enrollment_date, enrollment_date.year + years, department_id, scholarship_amount))
+        
+        self.cursor.executemany("""
                 INSERT INTO students (id, first_name, last_name, email, age, gpa, 
                                  enrollment_date, graduation_year, department_id, scholarship_amount)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (i, first_name, last_name, email, age, gpa,
-                   enrollment_date, graduation_year, department_id, scholarship_amount))
+            """, rows)
         
         print(f"✅ {num_students} students added")
     
@@ -252,6 +272,7 @@ class EnhancedSampleDataGenerator:
         
         ranks = ["Assistant Professor", "Associate Professor", "Professor", "Lecturer", "Adjunct Professor"]
         
+        rows = []
         for i in range(1, num_instructors + 1):
             first_name = random.choice(self.first_names)
             last_name = random.choice(self.last_names)
@@ -267,12 +288,14 @@ class EnhancedSampleDataGenerator:
             salary = random.uniform(60000, 150000)
             is_tenured = rank in ["Associate Professor", "Professor"] and random.random() > 0.3
             
-            self.cursor.execute("""
+            rows.append((i, first_name, last_name, email, phone, department_id,
+                         hire_date, rank, salary, is_tenured))
+        
+        self.cursor.executemany("""
                 INSERT INTO instructors (id, first_name, last_name, email, phone, 
                                     department_id, hire_date, rank, salary, is_tenured)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (i, first_name, last_name, email, phone, department_id,
-                   hire_date, rank, salary, is_tenured))
+            """, rows)
         
         print(f"✅ {num_instructors} instructors added")
     
@@ -282,6 +305,8 @@ class EnhancedSampleDataGenerator:
         
         semesters = ["Fall", "Spring", "Summer"]
         
+        rows = []
+        used_codes = set()
         for i in range(1, num_courses + 1):
             department_id = random.randint(1, len(self.departments))
             department_name = self.departments[department_id - 1]
@@ -289,19 +314,24 @@ class EnhancedSampleDataGenerator:
             course_list = self.course_names.get(department_name, ["General Course"])
             title = random.choice(course_list)
             code = f"{department_name[:3].upper()}{random.randint(100, 599)}"
+            while code in used_codes:  # Codes must be unique (see create_indexes)
+                code = f"{department_name[:3].upper()}{random.randint(100, 599)}"
+            used_codes.add(code)
             
             description = f"Advanced study of {title.lower()} for undergraduate and graduate students."
-            credits = random.choice(1, 2, 3, 4)
+            credits = random.choice([1, 2, 3, 4])
             semester = random.choice(semesters)
             year = random.randint(2020, 2024)
             max_students = random.randint(20, 200)
             
-            self.cursor.execute("""
+            rows.append((i, code, title, description, credits, department_id,
+                         semester, year, max_students))
+        
+        self.cursor.executemany("""
                 INSERT INTO courses (id, code, title, description, credits, department_id,
                                  semester, year, max_students)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (i, code, title, description, credits, department_id,
-                   semester, year, max_students))
+            """, rows)
         
         print(f"✅ {num_courses} courses added")
     
@@ -319,14 +349,17 @@ class EnhancedSampleDataGenerator:
         self.cursor.execute("SELECT MAX(id) FROM instructors")
         max_instructors = self.cursor.fetchone()[0] or 0
         
-        for i in range(1, num_enrollments + 1):
-            student_id = random.randint(1, max_students)
-            course_id = random.randint(1, max_courses)
-            instructor_id = random.randint(1, max_instructors)
-            
-            # Random enrollment date within current semester
-            days_ago = random.randint(0, 120)
-            enrollment_date = (datetime.now() - timedelta(days=days_ago)).date()
+        n = num_enrollments
+        student_ids = random.choices(range(1, max_students + 1), k=n)
+        course_ids = random.choices(range(1, max_courses + 1), k=n)
+        instructor_ids = random.choices(range(1, max_instructors + 1), k=n)
+        days_ago = random.choices(range(0, 121), k=n)  # Within the current semester
+        now = datetime.now()
+        
+        rows = []
+        for i, student_id, course_id, instructor_id, days in zip(
+                range(1, n + 1), student_ids, course_ids, instructor_ids, days_ago):
+            enrollment_date = (now - timedelta(days=days)).date()
             
             # Random grade (some may be null if course is ongoing)
             if random.random() > 0.3:  # 70% have grades
@@ -340,12 +373,14 @@ class EnhancedSampleDataGenerator:
             
             status = "completed" if grade else "active"
             
-            self.cursor.execute("""
+            rows.append((i, student_id, course_id, instructor_id, enrollment_date,
+                         grade, attendance_rate, final_score, status))
+        
+        self.cursor.executemany("""
                 INSERT INTO enrollments (id, student_id, course_id, instructor_id,
                                       enrollment_date, grade, attendance_rate, final_score, status)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (i, student_id, course_id, instructor_id, enrollment_date,
-                   grade, attendance_rate, final_score, status))
+            """, rows)
         
         print(f"✅ {num_enrollments} enrollments added")
     
@@ -355,23 +390,44 @@ class EnhancedSampleDataGenerator:
         
         categories = ["Textbook", "Reference", "Fiction", "Non-Fiction", "Journal", "Thesis", "Research Paper"]
         
-        for i in range(1, num_resources + 1):
-            title = f"{' '.join(random.choices(['Advanced', 'Introduction', 'Modern', 'Classic'], k=1))} {' '.join(random.choices(['Science', 'Mathematics', 'Literature', 'History', 'Engineering'], k=1))} Volume {random.randint(1, 10)}"
-            author = f"{random.choice(self.first_names)} {random.choice(self.last_names)}"
-            isbn = f"978-{random.randint(0, 9)}{random.randint(100000000, 999999999)}"
-            category = random.choice(categories)
-            publication_year = random.randint(1990, 2024)
-            total_copies = random.randint(1, 10)
-            available_copies = random.randint(0, total_copies)
-            location = f"Floor {random.randint(1, 5)}, Section {chr(65 + random.randint(0, 25))}{random.randint(1, 20)}"
-            added_date = (datetime.now() - timedelta(days=random.randint(0, 3650))).date()
-            
-            self.cursor.execute("""
+        n = num_resources
+        adjectives = random.choices(['Advanced', 'Introduction', 'Modern', 'Classic'], k=n)
+        subjects = random.choices(['Science', 'Mathematics', 'Literature', 'History', 'Engineering'], k=n)
+        volumes = random.choices(range(1, 11), k=n)
+        first_names = random.choices(self.first_names, k=n)
+        last_names = random.choices(self.last_names, k=n)
+        isbn_groups = random.choices(range(0, 10), k=n)
+        isbn_numbers = random.choices(range(100000000, 1000000000), k=n)
+        category_list = random.choices(categories, k=n)
+        publication_years = random.choices(range(1990, 2025), k=n)
+        total_copies_list = random.choices(range(1, 11), k=n)
+        floors = random.choices(range(1, 6), k=n)
+        sections = random.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=n)
+        shelves = random.choices(range(1, 21), k=n)
+        days_ago = random.choices(range(0, 3651), k=n)  # Added within the last 10 years
+        now = datetime.now()
+        
+        rows = []
+        for i in range(n):
+            total_copies = total_copies_list[i]
+            rows.append((
+                i + 1,
+                f"{adjectives[i]} {subjects[i]} Volume {volumes[i]}",
+                f"{first_names[i]} {last_names[i]}",
+                f"978-{isbn_groups[i]}{isbn_numbers[i]}",
+                category_list[i],
+                publication_years[i],
+                total_copies,
+                random.randint(0, total_copies),  # available copies
+                f"Floor {floors[i]}, Section {sections[i]}{shelves[i]}",
+                (now - timedelta(days=days_ago[i])).date(),
+            ))
+        
+        self.cursor.executemany("""
                 INSERT INTO library_resources (id, title, author, isbn, category, publication_year,
                                           total_copies, available_copies, location, added_date)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (i, title, author, isbn, category, publication_year,
-                   total_copies, available_copies, location, added_date))
+            """, rows)
         
         print(f"✅ {num_resources} library resources added")
     
@@ -379,9 +435,16 @@ class EnhancedSampleDataGenerator:
         """Create database indexes for better performance"""
         print("🔧 Creating database indexes...")
         
+        # Uniqueness is enforced by these indexes rather than column UNIQUE
+        # constraints, so they are built once after the bulk load
         indexes = [
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_departments_name ON departments(name)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_departments_code ON departments(code)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_courses_code ON courses(code)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_students_email ON students(email)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_instructors_email ON instructors(email)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_library_isbn ON library_resources(isbn)",
             "CREATE INDEX IF NOT EXISTS idx_students_department ON students(department_id)",
-            "CREATE INDEX IF NOT EXISTS idx_students_email ON students(email)",
             "CREATE INDEX IF NOT EXISTS idx_courses_department ON courses(department_id)",
             "CREATE INDEX IF NOT EXISTS idx_enrollments_student ON enrollments(student_id)",
             "CREATE INDEX IF NOT EXISTS idx_enrollments_course ON enrollments(course_id)",
@@ -540,7 +603,8 @@ class EnhancedSampleDataGenerator:
         # Create tables
         self.create_all_tables()
         
-        # Populate data
+        # Populate data in one explicit write transaction (committed below)
+        self.cursor.execute("BEGIN IMMEDIATE")
         self.populate_departments()
         self.populate_students(500)
         self.populate_instructors(100)
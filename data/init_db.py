@@ -13,7 +13,8 @@ CREATE TABLE IF NOT EXISTS students (
 )
 """)
 
-# Insert sample data
+# Insert sample data (one explicit transaction for the reset and inserts)
+cursor.execute("BEGIN IMMEDIATE")
 cursor.execute("DELETE FROM students")
 
 students = [
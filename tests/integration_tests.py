@@ -270,7 +270,7 @@ class TestSecurityIntegration:
         assert final_count == initial_count + 2
         
         # Check log details
-        recent_logs = self.security.audit_logs[-2:]
+        recent_logs = list(self.security.audit_logs)[-2:]
         assert recent_logs[0].action == "test_action_1"
         assert recent_logs[0].success is True
         assert recent_logs[1].action == "test_action_2"
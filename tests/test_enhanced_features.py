@@ -6,6 +6,8 @@ Tests AI/ML, Multi-DB, Performance, Security, and Web API
 import pytest
 import asyncio
 import json
+import jwt
+import sqlite3
 import time
 from datetime import datetime
 import sys
@@ -17,7 +19,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.enhanced_orchestrator import EnhancedOrchestrator
 from core.security_manager import security_manager, UserRole, Permission
 from core.database_manager import db_manager
-from core.performance_optimizer import performance_optimizer
+from core.sqlite_pool import SQLitePool
+from core.performance_optimizer import performance_optimizer, query_fingerprint
 from agents.enhanced_nlu_agent import EnhancedNLUAgent
 from web.api import app
 from fastapi.testclient import TestClient
@@ -110,6 +113,14 @@ class TestDatabaseManager:
         assert isinstance(schema, dict)
         assert isinstance(relations, list)
     
+    def test_schema_cache_invalidation(self):
+        """Test schema caching and invalidation"""
+        first = db_manager.get_schema("test_sqlite")
+        assert db_manager.get_schema("test_sqlite")[0] is first[0]
+
+        db_manager.invalidate_schema("test_sqlite")
+        assert "test_sqlite" not in db_manager._schema_cache
+
     def test_query_execution(self):
         """Test query execution"""
         # This would require actual test database setup
@@ -121,6 +132,13 @@ class TestDatabaseManager:
             # Expected if test database doesn't exist
             pass
     
+    def test_row_count_streaming(self):
+        """Test counting rows without materializing the result"""
+        count = db_manager.count_query_rows(
+            "test_sqlite", "SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3", chunk_size=2
+        )
+        assert count == 3
+    
     def test_connection_validation(self):
         """Test connection validation"""
         # Test invalid connection
@@ -137,6 +155,31 @@ class TestDatabaseManager:
         except Exception:
             pass
 
+class TestSQLitePool:
+    """Test WAL-tuned SQLite connection pool"""
+    
+    def test_wal_readers_see_writes(self, tmp_path):
+        """Test readers share the writer's WAL database"""
+        pool = SQLitePool(str(tmp_path / "pool.db"), readers=2)
+        try:
+            assert pool.writer.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            pool.writer.execute("CREATE TABLE t (x INTEGER)")
+            pool.writer.execute("INSERT INTO t VALUES (1)")
+            pool.writer.commit()
+            
+            with pool.reader() as reader:
+                assert reader is not pool.writer
+                assert reader.execute("SELECT x FROM t").fetchall() == [(1,)]
+        finally:
+            pool.close()
+    
+    def test_memory_database_uses_writer(self):
+        """Test in-memory databases fall back to the writer connection"""
+        pool = SQLitePool(":memory:")
+        with pool.reader() as reader:
+            assert reader is pool.writer
+        pool.close()
+
 class TestPerformanceOptimizer:
     """Test Performance Optimization Layer"""
     
@@ -165,6 +208,27 @@ class TestPerformanceOptimizer:
         assert optimized_query is not None
         assert isinstance(optimizations, list)
     
+    def test_index_suggestions_deduplicated(self):
+        """Test each WHERE column is suggested once, skipping keywords and literals"""
+        query = "SELECT * FROM t WHERE a = 1 AND A > 2 AND b LIKE 'x = y' AND 1 = 1"
+        suggestions = self.optimizer._suggest_indexes(query, "default")
+
+        assert [s.index_suggestion for s in suggestions] == [
+            "CREATE INDEX idx_a ON table_name (a)",
+            "CREATE INDEX idx_b ON table_name (b)",
+        ]
+
+    def test_limit_injection(self):
+        """Test LIMIT is added at the outermost clause boundary"""
+        optimize = self.optimizer.optimize_query_execution
+        
+        assert optimize("SELECT * FROM t ORDER BY a;")[0] == "SELECT * FROM t ORDER BY a LIMIT 1000;"
+        assert optimize("SELECT a FROM t ORDER BY a OFFSET 5")[0] == "SELECT a FROM t ORDER BY a LIMIT 1000 OFFSET 5"
+        assert optimize("SELECT id, offset FROM logs")[0] == "SELECT id, offset FROM logs LIMIT 1000"
+        assert optimize("SELECT * FROM t WHERE fetch = 1")[0] == "SELECT * FROM t WHERE fetch = 1 LIMIT 1000"
+        assert optimize("SELECT a FROM (SELECT a FROM t LIMIT 3) s")[0].endswith(" s LIMIT 1000")
+        assert optimize("SELECT a FROM t LIMIT 5")[0] == "SELECT a FROM t LIMIT 5"
+    
     def test_performance_report(self):
         """Test performance report generation"""
         report = self.optimizer.get_performance_report(24)
@@ -174,7 +238,7 @@ class TestPerformanceOptimizer:
     def test_cache_functionality(self):
         """Test caching functionality"""
         # Test cache count tracking
-        count = self.optimizer._get_cache_count(hash("test_query"))
+        count = self.optimizer._get_cache_count(query_fingerprint("test_query"))
         assert isinstance(count, int)
 
 class TestSecurityManager:
@@ -228,6 +292,70 @@ class TestSecurityManager:
         assert Permission.MANAGE_USERS in admin_permissions
         assert Permission.EXECUTE_QUERY in admin_permissions
     
+    def test_jwt_cache_rejects_expired_token(self):
+        """Test a cached token is verified again, and rejected, once it expires"""
+        policy = self.security.policy
+        token = jwt.encode({"user_id": "cached_user", "exp": int(time.time()) + 1},
+                           policy.jwt_secret_key, algorithm=policy.jwt_algorithm)
+        
+        first = self.security.verify_jwt_token(token)
+        assert first["user_id"] == "cached_user"
+        first["user_id"] = "tampered"
+        assert self.security.verify_jwt_token(token)["user_id"] == "cached_user"
+        cached = len(self.security._jwt_cache)
+        
+        time.sleep(2)
+        assert self.security.verify_jwt_token(token) is None
+        assert len(self.security._jwt_cache) == cached - 1
+    
+    def test_jwt_cache_skips_invalid_tokens(self):
+        """Test tokens that fail verification are never cached"""
+        cached = len(self.security._jwt_cache)
+        forged = jwt.encode({"user_id": "forged", "exp": int(time.time()) + 3600},
+                            "wrong-secret", algorithm="HS256")
+        
+        assert self.security.verify_jwt_token(forged) is None
+        assert self.security.verify_jwt_token("not-a-token") is None
+        assert len(self.security._jwt_cache) == cached
+    
+    def test_locked_user_count(self):
+        """Test lockouts stop counting once they expire or the user logs back in"""
+        policy = self.security.policy
+        for name in ("lockuser1", "lockuser2"):
+            self.security.create_user(name, f"{name}@example.com", "LockPass123!", UserRole.VIEWER)
+        before = self.security._count_locked_users()
+        
+        original = policy.lockout_duration_minutes
+        policy.lockout_duration_minutes = 0.01
+        try:
+            for name in ("lockuser1", "lockuser2"):
+                for _ in range(policy.max_failed_attempts):
+                    self.security.authenticate_user(name, "wrongpassword")
+            assert self.security._count_locked_users() == before + 2
+        finally:
+            policy.lockout_duration_minutes = original
+        
+        time.sleep(1)
+        token, _ = self.security.authenticate_user("lockuser2", "LockPass123!")
+        assert token is not None
+        assert self.security.get_user_by_username("lockuser2").locked_until is None
+        assert self.security._count_locked_users() == before
+    
+    def test_token_permissions(self):
+        """Test permission checks on packed and legacy token payloads"""
+        self.security.create_user("tokenuser", "token@example.com", "TokenPass123!", UserRole.VIEWER)
+        token, _ = self.security.authenticate_user("tokenuser", "TokenPass123!")
+        payload = self.security.verify_jwt_token(token)
+        
+        assert "pm" in payload
+        assert self.security.token_has_permission(payload, Permission.READ_DATA)
+        assert self.security.token_has_permission(payload, Permission.VIEW_SCHEMA)
+        assert not self.security.token_has_permission(payload, Permission.MANAGE_USERS)
+        
+        legacy = {"user_id": "legacy", "permissions": ["read_data", "execute_query"]}
+        assert self.security.token_has_permission(legacy, Permission.EXECUTE_QUERY)
+        assert not self.security.token_has_permission(legacy, Permission.DELETE_DATA)
+    
     def test_query_permission_validation(self):
         """Test query permission validation"""
         # Test SELECT query
@@ -327,6 +455,54 @@ class TestWebAPI:
         assert "explanation" in data
         assert "confidence" in data
 
+def _register_upper_case_db(tmp_path, name="orchestrator_test"):
+    """Register a small SQLite database named the way the regex NLU emits columns"""
+    conn = sqlite3.connect(str(tmp_path / "orchestrator.db"))
+    conn.execute("CREATE TABLE STUDENTS (ID INTEGER PRIMARY KEY, NAME TEXT, AGE INTEGER, MARKS INTEGER)")
+    conn.executemany(
+        "INSERT INTO STUDENTS (NAME, AGE, MARKS) VALUES (?, ?, ?)",
+        [("Asha", 19, 72), ("Ben", 25, 85), ("Chen", 35, 91)]
+    )
+    conn.commit()
+    conn.close()
+    
+    assert db_manager.add_connection(name, f"sqlite:///{tmp_path / 'orchestrator.db'}", "sqlite")
+    return name
+
+class _RecordingNLU:
+    """Regex NLU that records which questions reached parse"""
+    
+    use_transformers = False
+    
+    def __init__(self):
+        self.parsed = []
+        self._regex = EnhancedNLUAgent()
+        self._regex.use_transformers = False
+    
+    def parse(self, text, schema, semantic_score=None):
+        self.parsed.append(text)
+        intent = self._regex.parse(text, schema)
+        if semantic_score is not None:
+            intent["semantic_score"] = semantic_score
+        return intent
+
+class _BatchScoringNLU(_RecordingNLU):
+    """Recording NLU posing as a transformer agent; records batched scoring calls"""
+    
+    use_transformers = True
+    
+    def __init__(self, scores):
+        super().__init__()
+        self.scores = scores
+        self.batches = []
+    
+    def semantic_scores(self, texts):
+        self.batches.append(list(texts))
+        return self.scores[:len(texts)]
+    
+    def semantic_score(self, text):
+        raise AssertionError("handle_queries should score questions in one batch")
+
 class TestEnhancedOrchestrator:
     """Test Enhanced Orchestrator Integration"""
     
@@ -369,6 +545,115 @@ class TestEnhancedOrchestrator:
         assert "nlu_method" in ai_info
         assert "comparative_intent" in ai_info
     
+    def test_handle_queries_batches_semantic_scores(self, tmp_path):
+        """Test batched scoring skips commands and keeps input order"""
+        database = _register_upper_case_db(tmp_path)
+        nlu = _BatchScoringNLU([0.25, 0.75])
+        self.orchestrator.nlu = nlu
+        questions = [
+            "Find students with marks greater than 80",
+            "show tables",
+            "What is the average marks of students?"
+        ]
+        
+        results = self.orchestrator.handle_queries(questions, database=database)
+        
+        assert nlu.batches == [[questions[0], questions[2]]]
+        assert nlu.parsed == [questions[0], questions[2]]
+        assert len(results) == 3
+        assert "MARKS > 80" in results[0]["sql"]
+        assert results[1]["result"] == ["STUDENTS"]
+        assert "AVG" in results[2]["sql"].upper()
+        assert results[0]["ai_enhancements"]["semantic_score"] == 0.25
+        assert results[2]["ai_enhancements"]["semantic_score"] == 0.75
+    
+    def test_plan_cache_reuses_plan(self, tmp_path):
+        """Test a repeated question reuses its plan until the schema object changes"""
+        database = _register_upper_case_db(tmp_path)
+        nlu = _RecordingNLU()
+        self.orchestrator.nlu = nlu
+        question = "What is the average marks of students?"
+        
+        first = self.orchestrator.handle_query(question, database=database)
+        second = self.orchestrator.handle_query(question, database=database)
+        assert nlu.parsed == [question]
+        assert second["sql"] == first["sql"]
+        assert "AVG(MARKS)" in second["sql"]
+        
+        self.orchestrator._schema_cache.pop(database)
+        db_manager.invalidate_schema(database)
+        third = self.orchestrator.handle_query(question, database=database)
+        assert nlu.parsed == [question, question]
+        assert third["sql"] == first["sql"]
+    
+    def test_fast_path_plans_without_nlu(self, tmp_path):
+        """Test trivial table questions skip the NLU, other words fall through to it"""
+        database = _register_upper_case_db(tmp_path)
+        nlu = _RecordingNLU()
+        self.orchestrator.nlu = nlu
+        
+        count = self.orchestrator.handle_query("how many students", database=database)
+        listing = self.orchestrator.handle_query("list all students", database=database)
+        assert nlu.parsed == []
+        assert count["sql"].startswith("SELECT COUNT(*) FROM STUDENTS")
+        assert count["result"] == [{"COUNT(*)": 3}]
+        assert listing["sql"].startswith("SELECT * FROM STUDENTS")
+        assert len(listing["result"]) == 3
+        assert listing["ai_enhancements"]["nlu_method"] == "fast_path"
+        
+        self.orchestrator.handle_query("how many teachers", database=database)
+        assert nlu.parsed == ["how many teachers"]
+    
+    def test_template_rebinds_question_number(self, tmp_path):
+        """Test a question differing only in its number reuses the planned template"""
+        database = _register_upper_case_db(tmp_path)
+        nlu = _RecordingNLU()
+        self.orchestrator.nlu = nlu
+        
+        first = self.orchestrator.handle_query("Find students with age greater than 20", database=database)
+        second = self.orchestrator.handle_query("Find students with age greater than 30", database=database)
+        
+        assert nlu.parsed == ["Find students with age greater than 20"]
+        assert "AGE > 20" in first["sql"]
+        assert "AGE > 30" in second["sql"] and "AGE > 20" not in second["sql"]
+        assert second["result"] == [{"AGE": 35}]
+        assert "AGE is greater than 30" in second["explanation"]
+    
+    def test_template_requires_single_where_number(self, tmp_path):
+        """Test questions whose number is not the WHERE value, or with two numbers, are never templated"""
+        database = _register_upper_case_db(tmp_path)
+        nlu = _RecordingNLU()
+        self.orchestrator.nlu = nlu
+        questions = [
+            "List the top 3 students",
+            "List the top 4 students",
+            "Find students with age greater than 20 and marks greater than 50",
+            "Find students with age greater than 30 and marks greater than 50"
+        ]
+        
+        for question in questions:
+            self.orchestrator.handle_query(question, database=database)
+        
+        assert nlu.parsed == questions
+        assert len(self.orchestrator._template_cache) == 0
+    
+    def test_template_bypassed_for_new_schema(self, tmp_path):
+        """Test a template is not reused once the schema object changes"""
+        database = _register_upper_case_db(tmp_path)
+        nlu = _RecordingNLU()
+        self.orchestrator.nlu = nlu
+        
+        self.orchestrator.handle_query("Find students with age greater than 20", database=database)
+        self.orchestrator._schema_cache.pop(database)
+        db_manager.invalidate_schema(database)
+        result = self.orchestrator.handle_query("Find students with age greater than 30", database=database)
+        
+        assert nlu.parsed == [
+            "Find students with age greater than 20",
+            "Find students with age greater than 30"
+        ]
+        assert "AGE > 30" in result["sql"]
+    
     def test_performance_monitoring(self):
         """Test performance monitoring integration"""
         result = self.orchestrator.handle_query("Count the number of students")
@@ -7,11 +7,18 @@ from pydantic import BaseModel
 from typing import List, Dict, Optional, Any
 import json
 import asyncio
+import importlib.util
 import logging
 from datetime import datetime
 import sys
 import os
 
+# Serialize JSON responses with orjson when installed
+if importlib.util.find_spec("orjson") is not None:
+    from fastapi.responses import ORJSONResponse as JSONResponseClass
+else:
+    from fastapi.responses import JSONResponse as JSONResponseClass
+
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -22,7 +29,8 @@ from core.security_manager import security_manager, Permission, UserRole
 app = FastAPI(
     title="NeuroSQL API",
     description="Advanced NL-to-SQL with AI Integration",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=JSONResponseClass
 )
 
 # CORS middleware
@@ -276,22 +284,22 @@ async def execute_query(
     
     try:
         # Execute query with enhanced orchestrator
-        result = orchestrator.handle_query(
+        result = orchestrator.run_query(
             request.question, 
             user_id=current_user.get("user_id"),
             database=request.database
         )
         
         return QueryResponse(
-            sql=result.get("sql"),
-            result=result.get("result"),
-            explanation=result.get("explanation", ""),
-            confidence=result.get("confidence", 0.0),
-            execution_time=result.get("execution_time", 0.0),
+            sql=result.sql,
+            result=result.result,
+            explanation=result.explanation,
+            confidence=result.confidence,
+            execution_time=result.execution_time or 0.0,
             timestamp=datetime.now().isoformat(),
-            performance_metrics=result.get("performance_metrics"),
-            ai_enhancements=result.get("ai_enhancements"),
-            security_info=result.get("security_info")
+            performance_metrics=result.performance_metrics,
+            ai_enhancements=result.ai_enhancements,
+            security_info=result.security_info
         )
         
     except Exception as e:
@@ -445,7 +453,7 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
         "username": user.username,
         "email": user.email,
         "role": user.role.value,
-        "permissions": [p.value for p in user.permissions],
+        "permissions": [p.value for p in Permission if p in user.permissions],  # declaration order
         "created_at": user.created_at.isoformat(),
         "last_login": user.last_login.isoformat() if user.last_login else None
     }